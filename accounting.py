@@ -0,0 +1,82 @@
+import predefined_errors
+import versions
+from file_system import FileNode
+
+# system_states["usage"] maps each owner to {"file": count, "directory": count}, and
+# system_states["quotas"] maps users to their limits in the same form (None for no limit).
+# Both are kept up to date by the commands, so no query needs a tree scan.
+# Symbolic links count as files. The children of virtual directories belong to their provider,
+# so they are not counted.
+
+
+def counted_type(node: FileNode) -> str:
+    return "directory" if node.type == "directory" else "file"
+
+
+def is_counted(node: FileNode) -> bool:
+    return node.parent is None or node.parent._virtual is None
+
+
+def usage_of(system_states: dict, user: str) -> dict:
+    return system_states.setdefault("usage", {}).setdefault(user, {"file": 0, "directory": 0})
+
+
+def _add(system_states: dict, user: str, file_type: str, delta: int):
+    # counters are part of the versions of the states, so undo brings them back as well
+    usage = usage_of(system_states, user)
+    versions.set_item(usage, file_type, usage[file_type] + delta)
+
+
+def charge(system_states: dict, node: FileNode):
+    # count a new node for its owner
+    if is_counted(node):
+        _add(system_states, node.owner, counted_type(node), 1)
+
+
+def release(system_states: dict, node: FileNode):
+    # stop counting a removed node
+    if is_counted(node):
+        _add(system_states, node.owner, counted_type(node), -1)
+
+
+def transfer(system_states: dict, node: FileNode, old_owner: str):
+    # move a node from the counters of its old owner to the ones of its new owner
+    if is_counted(node):
+        _add(system_states, old_owner, counted_type(node), -1)
+        _add(system_states, node.owner, counted_type(node), 1)
+
+
+def relocate(system_states: dict, node: FileNode, old_parent: FileNode):
+    # a node moved in or out of a virtual directory starts or stops being counted
+    was_counted = old_parent._virtual is None
+    if was_counted and not is_counted(node):
+        _add(system_states, node.owner, counted_type(node), -1)
+    elif not was_counted and is_counted(node):
+        _add(system_states, node.owner, counted_type(node), 1)
+
+
+def check_quota(system_states: dict, user: str, file_type: str):
+    """Make sure that a user may own one more file or directory.
+
+    Args:
+        user (str): The owner of the node to create
+        file_type (str): "file" or "directory"
+    """
+    limit = system_states.get("quotas", {}).get(user, {}).get(file_type)
+    if limit is not None and usage_of(system_states, user)[file_type] >= limit:
+        raise predefined_errors.QuotaExceeded
+
+
+def set_quota(system_states: dict, user: str, files: int, directories: int):
+    versions.set_item(system_states.setdefault("quotas", {}), user, {"file": files, "directory": directories})
+
+
+def recount(system_states: dict):
+    # rebuild the counters with a full scan, for states that were not built by the commands
+    system_states["usage"] = {}
+    stack = [system_states["root"]]
+    while len(stack) > 0:
+        node = stack.pop()
+        # only what is in memory: virtual directories are not materialized by the scan
+        stack.extend(node._children.values())
+        charge(system_states, node)
@@ -0,0 +1,73 @@
+'''
+Cost of auditing who can access a subtree: one check per user and file with is_file_doable,
+against the vectorized audit. Both must agree.
+
+Usage: python benchmarks/bench_access_audit.py [USERS]
+'''
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import nautilus
+from access_audit import audit
+from file_system import FileNode
+from utilities import is_file_doable, is_file_ancestors_doable
+
+
+def build(system_states: dict, users: list[str], fanout: int, depth: int) -> FileNode:
+    # a balanced tree with random modes and owners
+    top = FileNode("audit", 0b1111101, "root", system_states["root"])
+    level = [top]
+    for current_depth in range(depth):
+        is_last = current_depth == depth - 1
+        level = [FileNode(f"n{i}", (0 if is_last else 0b1000000) | random.getrandbits(6),
+                          random.choice(users), node)
+                 for node in level for i in range(fanout)]
+    return top
+
+
+def one_by_one(system_states: dict, top: FileNode) -> dict:
+    # what answering the question with su and the permission helpers amounts to
+    nodes = []
+    stack = [top]
+    while len(stack) > 0:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.children.values())
+    report = {}
+    for user in sorted(system_states["users"]):
+        system_states["effective_user"] = user
+        counts = {"r": 0, "w": 0, "x": 0, "total": len(nodes)}
+        for node in nodes:
+            if is_file_ancestors_doable("x", node, system_states):
+                for permission in "rwx":
+                    counts[permission] += is_file_doable(permission, node, system_states)
+        report[user] = counts
+    system_states["effective_user"] = "root"
+    return report
+
+
+def main():
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    random.seed(0)
+    for fanout, depth in [(10, 3), (10, 4), (20, 4)]:
+        system_states = nautilus.init()
+        users = ["root"] + [f"user{i}" for i in range(user_count - 1)]
+        system_states["users"] = set(users)
+        top = build(system_states, users, fanout, depth)
+        start = time.perf_counter()
+        expected = one_by_one(system_states, top)
+        slow = time.perf_counter() - start
+        start = time.perf_counter()
+        report = audit(system_states, top)
+        fast = time.perf_counter() - start
+        assert report == expected
+        print(f"{expected['root']['total']:>8} nodes, "
+              f"{user_count} users: one by one {slow * 1e3:9.1f}ms, vectorized {fast * 1e3:7.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+'''
+Cost of diffing two large subtrees that differ in a few nodes, against the tree size; and of
+one chmod in a wide directory: hashing again, diffing two copies of it, and diffing the states
+before and after it.
+
+Usage: python benchmarks/bench_diff.py [CHANGES]
+'''
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import nautilus
+import versions
+from file_system import FileNode
+from tree_diff import diff_trees, diff_versions
+
+
+def build(parent: FileNode, name: str, fanout: int, depth: int) -> FileNode:
+    # a balanced tree of directories, with files at the bottom
+    root = FileNode(name, 0b1111101, "root", parent)
+    level = [root]
+    for current_depth in range(depth):
+        mode = 0b1111101 if current_depth < depth - 1 else 0b0110100
+        level = [FileNode(f"n{i}", mode, "root", node) for node in level for i in range(fanout)]
+    return root
+
+
+def main():
+    changes = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    random.seed(0)
+    for fanout, depth in [(10, 3), (10, 4), (10, 5)]:
+        system_states = nautilus.init()
+        old = build(system_states["root"], "old", fanout, depth)
+        new = build(system_states["root"], "new", fanout, depth)
+        start = time.perf_counter()
+        old.content_hash, new.content_hash
+        full_hash = time.perf_counter() - start
+        for _ in range(changes):
+            node = new
+            while len(node.children) > 0:
+                node = random.choice(list(node.children.values()))
+            node.mode ^= 0b0000100
+        start = time.perf_counter()
+        found = list(diff_trees(old, new))
+        elapsed = time.perf_counter() - start
+        print(f"{fanout ** depth:>7} leaves: first full hash {full_hash * 1e3:8.1f}ms, "
+              f"diff of {len(found)} changes {elapsed * 1e3:6.2f}ms")
+
+    width = 200000
+    system_states = nautilus.init()
+    tree = versions.VersionTree()
+    old = build(system_states["root"], "old", width, 1)
+    new = build(system_states["root"], "new", width, 1)
+    old.content_hash, new.content_hash
+    before = tree.current
+    with versions.recording(tree):
+        new.children["n100"].mode ^= 0b0000100
+    start = time.perf_counter()
+    new.content_hash
+    rehash = time.perf_counter() - start
+    start = time.perf_counter()
+    found = list(diff_trees(old, new))
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    found_between = diff_versions(system_states["root"], tree, before, tree.current)
+    elapsed_between = time.perf_counter() - start
+    print(f"chmod in {width} entries: hash again {rehash * 1e3:.2f}ms, "
+          f"diff of {len(found)} changes {elapsed * 1e3:.1f}ms, "
+          f"diff of the states {len(found_between)} changes {elapsed_between * 1e3:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
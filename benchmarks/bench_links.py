@@ -0,0 +1,41 @@
+'''
+Path lookups through chains of symbolic links against plain lookups of the same node.
+
+Usage: python benchmarks/bench_links.py [LOOKUPS]
+'''
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import nautilus
+from file_system import FileNode, FilePath
+
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    system_states = nautilus.init()
+    current = system_states["root"]
+    for i in range(8):
+        current = FileNode(f"level{i}", 0b1111101, "root", current)
+    FileNode("target", 0b0110100, "root", current)
+    # link0 -> /level0/.../level7, and every other link points to the previous one
+    FileNode("link0", 0b0111111, "root", system_states["root"],
+             link_target="/" + "/".join(f"level{i}" for i in range(8)))
+    for i in range(1, 5):
+        FileNode(f"link{i}", 0b0111111, "root", system_states["root"], link_target=f"link{i - 1}")
+    cases = [("plain", "/" + "/".join(f"level{i}" for i in range(8)) + "/target")]
+    cases += [(f"{i + 1} link(s)", f"/link{i}/target") for i in range(5)]
+    for label, path in cases:
+        file_path = FilePath(system_states, path)
+        assert file_path.get_node(system_states).name == "target"
+        start = time.perf_counter()
+        for _ in range(lookups):
+            file_path.get_node(system_states)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<12} {elapsed / lookups * 1e9:8.0f} ns per get_node")
+
+
+if __name__ == '__main__':
+    main()
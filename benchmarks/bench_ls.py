@@ -0,0 +1,44 @@
+'''
+Benchmark of `ls -l` on a directory holding a large number of entries.
+
+Usage: python benchmarks/bench_ls.py [ENTRIES]
+'''
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import builtin_commands
+import nautilus
+
+
+def build_wide_directory(entries: int) -> dict:
+    system_states = nautilus.init()
+    root = system_states["root"]
+    for i in range(entries):
+        builtin_commands.FileNode(f"file{i:07d}", 0b0110100, "root", root)
+    return system_states
+
+
+def time_ls(system_states: dict, args: dict) -> float:
+    sink = io.StringIO()
+    start = time.perf_counter()
+    with redirect_stdout(sink):
+        builtin_commands.cmd_ls(args, system_states)
+    return time.perf_counter() - start
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    system_states = build_wide_directory(entries)
+    for label, args in [("ls", {}), ("ls -l", {"long": True}),
+                        ("ls --null", {"null": True}), ("ls --json", {"json": True})]:
+        elapsed = time_ls(system_states, args)
+        print(f"{label:<10} {entries} entries: {elapsed:.3f}s ({entries / elapsed:,.0f} entries/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+'''
+Benchmark of `ls -R -l` on a large tree: time to the first line, total time, and the peak
+memory of the walk, which should not grow with the number of nodes.
+
+Usage: python benchmarks/bench_ls_recursive.py [NODES]
+'''
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import builtin_commands
+import nautilus
+from file_system import FileNode
+
+
+class Sink:
+    # throws the listing away, noting when the first line came out
+    def __init__(self):
+        self.first_write = None
+        self.written = 0
+
+    def write(self, text: str):
+        if self.first_write is None:
+            self.first_write = time.perf_counter()
+        self.written += len(text)
+
+    def flush(self):
+        pass
+
+
+def build(system_states: dict, nodes: int, fanout: int = 10):
+    # a tree of directories with `fanout` entries each, breadth first
+    level = [FileNode("top", 0b1111101, "root", system_states["root"])]
+    count = 1
+    while count < nodes:
+        next_level = []
+        for directory in level:
+            for i in range(fanout):
+                next_level.append(FileNode(f"n{i}", 0b1111101, "root", directory))
+                count += 1
+        level = next_level
+
+
+def main():
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    system_states = nautilus.init()
+    build(system_states, nodes)
+    for label, trace_memory in [("time", False), ("memory", True)]:
+        sink = Sink()
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with redirect_stdout(sink):
+            builtin_commands.cmd_ls({"recursive": True, "long": True, "path": "/top"}, system_states)
+        elapsed = time.perf_counter() - start
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"peak memory of the walk: {peak / 1024:.0f}KiB")
+        else:
+            print(f"{nodes} nodes: first line after {(sink.first_write - start) * 1e3:.2f}ms, "
+                  f"{sink.written / 1e6:.1f}MB in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+'''
+Bytes per node against tree shape (deep vs. wide vs. balanced), measured both by
+memory_stats.measure_footprint and by tracemalloc while the tree is built.
+
+Usage: python benchmarks/bench_memory.py [--plot FILE]
+The plot needs matplotlib; without it only the table is printed.
+'''
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import nautilus
+from file_system import FileNode
+from memory_stats import measure_footprint
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+def build(shape: str, size: int) -> dict:
+    system_states = nautilus.init()
+    root = system_states["root"]
+    if shape == "wide":
+        for i in range(size):
+            FileNode(f"f{i}", 0b0110100, "root", root)
+    elif shape == "deep":
+        current = root
+        for i in range(size):
+            current = FileNode(f"d{i}", 0b1111101, "root", current)
+    elif shape == "balanced":
+        # ten entries per directory, breadth first
+        queue = [root]
+        created = 0
+        while created < size:
+            parent = queue.pop(0)
+            for i in range(min(10, size - created)):
+                queue.append(FileNode(f"d{i}", 0b1111101, "root", parent))
+                created += 1
+    return system_states
+
+
+def main():
+    results = {}
+    print(f"{'shape':<10}{'nodes':>10}{'walk B/node':>14}{'traced B/node':>15}")
+    for shape in ["wide", "deep", "balanced"]:
+        for size in SIZES:
+            tracemalloc.start()
+            system_states = build(shape, size)
+            traced, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report = measure_footprint(system_states)
+            walked = sum(report[category][1] for category in report
+                         if isinstance(report[category], tuple))
+            results.setdefault(shape, []).append((size, walked / report["node_count"]))
+            print(f"{shape:<10}{size:>10}{walked / report['node_count']:>14.1f}"
+                  f"{traced / report['node_count']:>15.1f}")
+    if "--plot" in sys.argv:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        for shape, points in results.items():
+            plt.plot([size for size, _ in points], [per_node for _, per_node in points],
+                     marker="o", label=shape)
+        plt.xscale("log")
+        plt.xlabel("nodes")
+        plt.ylabel("bytes per node")
+        plt.legend()
+        plt.savefig(sys.argv[sys.argv.index("--plot") + 1])
+
+
+if __name__ == '__main__':
+    main()
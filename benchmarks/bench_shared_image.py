@@ -0,0 +1,69 @@
+'''
+Read throughput of the shared-memory tree image against the number of worker processes.
+
+Usage: python benchmarks/bench_shared_image.py [REQUESTS] [MAX_WORKERS]
+'''
+import io
+import os
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import nautilus
+import shared_image
+from file_system import FileNode
+
+
+def build_tree(directories: int, files: int) -> dict:
+    system_states = nautilus.init()
+    for i in range(directories):
+        directory = FileNode(f"dir{i}", 0b1111101, "root", system_states["root"])
+        for j in range(files):
+            FileNode(f"file{j}", 0b0110100, "root", directory)
+    return system_states
+
+
+def main():
+    request_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    system_states = build_tree(200, 500)
+    random.seed(0)
+    requests = []
+    for _ in range(request_count):
+        directory = f"/dir{random.randrange(200)}"
+        requests.append(random.choice([
+            ("root", "/", f"ls -l {directory}/file{random.randrange(500)}"),
+            ("root", directory, f"cd ../dir{random.randrange(200)}"),
+            ("root", "/", f"ls -d {directory}"),
+        ]))
+    # baseline: the builtin commands in this process
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        for user, pwd, line in requests:
+            system_states["pwd"] = system_states["root"] if pwd == "/" \
+                else system_states["root"].children[pwd[1:]]
+            nautilus.run(line, system_states)
+    elapsed = time.perf_counter() - start
+    print(f"in-process builtins: {request_count / elapsed:,.0f} requests/s")
+    system_states["pwd"] = system_states["root"]
+    publisher = shared_image.ImagePublisher(system_states)
+    publisher.publish()
+    workers = 1
+    while workers <= max_workers:
+        pool = shared_image.QueryPool(publisher, workers)
+        # attach every worker before timing
+        pool.query(requests[:workers * 64])
+        start = time.perf_counter()
+        pool.query(requests, chunksize=256)
+        elapsed = time.perf_counter() - start
+        pool.close()
+        print(f"{workers} worker(s): {request_count / elapsed:,.0f} requests/s")
+        workers *= 2
+    publisher.close()
+
+
+if __name__ == '__main__':
+    main()
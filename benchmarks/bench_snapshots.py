@@ -0,0 +1,77 @@
+'''
+Throughput and memory of a mutation-heavy session with and without versions, taking a
+snapshot every few commands, and the cost of restoring the oldest snapshot.
+
+Usage: python benchmarks/bench_snapshots.py [COMMANDS] [SNAPSHOT_EVERY]
+'''
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import nautilus
+
+
+def workload(commands: int, snapshot_every: int, keep_versions: bool) -> list[str]:
+    # directories and files are created, changed and removed at random
+    random.seed(0)
+    lines = ["mkdir /w"]
+    files = []
+    for i in range(commands):
+        choice = random.random()
+        if choice < 0.5 or len(files) == 0:
+            files.append(f"/w/f{i}")
+            lines.append(f"touch {files[-1]}")
+        elif choice < 0.8:
+            lines.append(f"chmod {random.choice(['u-w', 'u+w', 'o+r'])} {random.choice(files)}")
+        else:
+            lines.append(f"rm {files.pop(random.randrange(len(files)))}")
+        if keep_versions and snapshot_every > 0 and i % snapshot_every == 0:
+            lines.append(f"snapshot s{i}")
+    return lines
+
+
+def run(lines: list[str], keep_versions: bool, trace_memory: bool) -> tuple:
+    system_states = nautilus.init()
+    if not keep_versions:
+        system_states["versions"] = None
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for line in lines:
+            nautilus.execute(line, system_states)
+    elapsed = time.perf_counter() - start
+    memory = 0
+    if trace_memory:
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    return system_states, elapsed, memory
+
+
+def main():
+    commands = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    snapshot_every = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    for label, keep_versions, every in [("no versions", False, 0),
+                                        ("undo history only", True, 0),
+                                        (f"snapshot every {snapshot_every}", True, snapshot_every)]:
+        lines = workload(commands, every, keep_versions)
+        # timed without tracemalloc, which slows allocations down
+        _, _, memory = run(lines, keep_versions, True)
+        system_states, elapsed, _ = run(lines, keep_versions, False)
+        print(f"{label:>20}: {len(lines) / elapsed:9.0f} commands/s, {memory / 1024:8.0f}KiB live")
+        if every > 0:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                nautilus.execute("restore s0", system_states)
+            print(f"{'':>20}  restore of the oldest snapshot {(time.perf_counter() - start) * 1e3:.1f}ms, "
+                  f"{len(system_states['root'].children['w'].children)} files left")
+
+
+if __name__ == '__main__':
+    main()
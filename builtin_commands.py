@@ -1,5 +1,13 @@
+import json
+import sys
+import accounting
+from access_audit import allowed_nodes, audit
 from file_system import FileNode, FilePath
+from memory_stats import measure_footprint
+from tree_diff import diff_trees, diff_versions
 import predefined_errors
+import versions
+import watch
 from utilities import is_file_doable, is_file_ancestors_doable, string_validity_check
 
 
@@ -43,14 +51,20 @@ def cmd_mkdir(args: dict, system_states: dict):
         # find the corresponding node of the current level
         child_node: FileNode = current_node.children.get(dir_name)
         if child_node is not None:
-            # point to the found file node
-            current_node = child_node
+            # point to the found file node (or to what it points to if it is a symbolic link)
+            current_node = child_node.follow(system_states)
+            # a file (or a link to one) cannot hold the next level
+            if current_node is None or current_node.type != "directory":
+                raise predefined_errors.NautilusException("Ancestor directory does not exist")
         else:
             # corresponding node not found...
             if create_parents:
                 # create the file node of the current level as per user instruction
+                accounting.check_quota(system_states, system_states["effective_user"], "directory")
                 current_node = FileNode(dir_name, 0b1111101,
                                system_states["effective_user"], current_node)
+                accounting.charge(system_states, current_node)
+                watch.emit(system_states, "create", current_node)
             else:
                 raise predefined_errors.NautilusException("Ancestor directory does not exist")
     # parent writable check
@@ -59,12 +73,22 @@ def cmd_mkdir(args: dict, system_states: dict):
     # ancestor executable check
     if not is_file_ancestors_doable("x", current_node, system_states):
         raise predefined_errors.PermissionDenied
-    if file_path.get_node(system_states) is not None and not create_parents:
+    existing = file_path.get_node(system_states, follow_links=False)
+    if existing is not None:
+        # with -p an existing directory (or a link to one) is left as it is, instead of being
+        # replaced; anything else is in the way
+        target = existing.follow(system_states)
+        if create_parents and file_path.file_name is not None \
+           and target is not None and target.type == "directory":
+            return
         raise predefined_errors.NautilusException("File exists")
     # create the required directory if all checks are passed
     if file_path.file_name is not None:
-        FileNode(file_path.file_name, 0b1111101,
-                system_states["effective_user"], current_node)
+        accounting.check_quota(system_states, system_states["effective_user"], "directory")
+        new_dir = FileNode(file_path.file_name, 0b1111101,
+                           system_states["effective_user"], current_node)
+        accounting.charge(system_states, new_dir)
+        watch.emit(system_states, "create", new_dir)
     else:
         raise predefined_errors.NautilusException("File exists")
 
@@ -88,9 +112,12 @@ def cmd_touch(args: dict, system_states: dict):
        or not is_file_ancestors_doable("x", parent, system_states):
         raise predefined_errors.PermissionDenied
     # only do new file creation when the file to touch does not exist
-    if file_path.get_node(system_states) is None:
-        FileNode(file_path.file_name, 0b0110100,
-                 system_states["effective_user"], parent)
+    if file_path.get_node(system_states, follow_links=False) is None:
+        accounting.check_quota(system_states, system_states["effective_user"], "file")
+        new_file = FileNode(file_path.file_name, 0b0110100,
+                            system_states["effective_user"], parent)
+        accounting.charge(system_states, new_file)
+        watch.emit(system_states, "create", new_file)
 
 
 def cmd_cp(args: dict, system_states: dict):
@@ -100,7 +127,9 @@ def cmd_cp(args: dict, system_states: dict):
     if not src_path.validity or not dst_path.validity:
         raise predefined_errors.InvalidSyntax
     dst_node = dst_path.get_node(system_states)
-    # the destination node should not exist
+    # the destination node should not exist (not even as a dangling link)
+    if dst_path.get_node(system_states, follow_links=False) is not None and dst_node is None:
+        raise predefined_errors.NautilusException("File exists")
     if dst_node is not None:
         if dst_node.type == "file":
             raise predefined_errors.NautilusException("File exists")
@@ -132,24 +161,99 @@ def cmd_cp(args: dict, system_states: dict):
         raise predefined_errors.PermissionDenied
     if not is_file_ancestors_doable("x", target_dir, system_states):
         raise predefined_errors.PermissionDenied
-    # create the copy at the specified destination path
-    FileNode(dst_path.file_name, src_node.mode, src_node.owner, target_dir)
+    # create the copy at the specified destination path (the copy keeps the owner of the source)
+    accounting.check_quota(system_states, src_node.owner, "file")
+    dst_node = FileNode(dst_path.file_name, src_node.mode, src_node.owner, target_dir)
+    accounting.charge(system_states, dst_node)
+    watch.emit(system_states, "create", dst_node)
 
 
 def cmd_mv(args: dict, system_states: dict):
-    # mv is basically copy and then remove the source node
-    cmd_cp(args, system_states)
-    # source node should exist and writable
     src_path = FilePath(system_states, args["src"])
-    src_node = src_path.get_node(system_states)
-    # check if the source node exists
+    dst_path = FilePath(system_states, args["dst"])
+    # check name validity of both source path and destination path
+    if not src_path.validity or not dst_path.validity:
+        raise predefined_errors.InvalidSyntax
+    # resolve each path once: the destination's parent directory, and the source itself
+    # (a symbolic link is moved itself, rather than what it points to)
+    target_dir = dst_path.get_node(system_states, require_parent_node=True)
+    if dst_path.is_root:
+        dst_node = target_dir
+    elif target_dir is not None:
+        dst_node = target_dir.children.get(dst_path.file_name)
+    else:
+        dst_node = None
+    # the destination node should not exist
+    if dst_node is not None:
+        dst_node_target = dst_node.follow(system_states)
+        if dst_node_target is not None and dst_node_target.type == "directory":
+            raise predefined_errors.NautilusException("Destination is a directory")
+        raise predefined_errors.NautilusException("File exists")
+    src_node = src_path.get_node(system_states, follow_links=False)
+    # source node should exist
     if src_node is None:
         raise predefined_errors.NautilusException("No such file")
+    # check if the effective user can READ the source node
+    if not is_file_doable("r", src_node, system_states):
+        raise predefined_errors.PermissionDenied
+    # check if the effective user can EXECUTE the source node's ancestors
+    if not is_file_ancestors_doable("x", src_node, system_states):
+        raise predefined_errors.PermissionDenied
+    if target_dir is None or target_dir.type != "directory":
+        raise predefined_errors.FileNotFound
+    # check if the user can WRITE the destination's parent node,
+    # and EXECUTE the destination's ancestor nodes
+    if not is_file_doable("w", target_dir, system_states) \
+       or not is_file_doable("x", target_dir, system_states):
+        raise predefined_errors.PermissionDenied
+    if not is_file_ancestors_doable("x", target_dir, system_states):
+        raise predefined_errors.PermissionDenied
     # check if the source node is WRITABLE
     if not is_file_doable("w", src_node, system_states):
         raise predefined_errors.PermissionDenied
-    # terminate the parent-child relationship between source node and its original parent
+    # a directory cannot go into its own subtree (the walk up is O(depth))
+    if src_node is target_dir or src_node in target_dir.ancestors:
+        raise predefined_errors.NautilusException("Cannot move a directory into itself")
+    # both directories must accept the change before anything is relinked, so a refused
+    # move leaves the node where it was
+    src_node.parent.check_writable()
+    target_dir.check_writable()
+    # relink the node with its whole subtree under the new parent and name
+    old_parent: FileNode = src_node.parent
+    old_path = str(FilePath.from_node(system_states, src_node))
     src_node.parent = None
+    src_node.rename(dst_path.file_name)
+    src_node.parent = target_dir
+    accounting.relocate(system_states, src_node, old_parent)
+    watch.emit(system_states, "move", src_node, old_path, old_parent)
+
+
+def cmd_ln(args: dict, system_states: dict):
+    # only symbolic links can be made, as files have no content to share
+    if not args.get("symbolic", False):
+        raise predefined_errors.NautilusException("Hard links are not supported")
+    target: str = args["target"]
+    link_path = FilePath(system_states, args["link"])
+    # check name validity of the link and of every level of the target
+    if not link_path.validity or link_path.is_root \
+       or not all(string_validity_check(level) for level in target.split("/")):
+        raise predefined_errors.InvalidSyntax
+    parent: FileNode = link_path.get_node(system_states, require_parent_node=True)
+    if parent is None:
+        raise predefined_errors.NautilusException("Ancestor directory does not exist")
+    # same permissions as creating a file with touch
+    if not is_file_doable("w", parent, system_states) \
+       or not is_file_doable("x", parent, system_states) \
+       or not is_file_ancestors_doable("x", parent, system_states):
+        raise predefined_errors.PermissionDenied
+    if link_path.get_node(system_states, follow_links=False) is not None:
+        raise predefined_errors.NautilusException("File exists")
+    # the target does not have to exist; the link is followed whenever it is used
+    accounting.check_quota(system_states, system_states["effective_user"], "file")
+    new_link = FileNode(link_path.file_name, 0b0111111,
+                        system_states["effective_user"], parent, link_target=target)
+    accounting.charge(system_states, new_link)
+    watch.emit(system_states, "create", new_link)
 
 
 def cmd_rm(args: dict, system_states: dict):
@@ -157,17 +261,22 @@ def cmd_rm(args: dict, system_states: dict):
     # check name validity
     if not target_node_path.validity:
         raise predefined_errors.InvalidSyntax
-    target_node = target_node_path.get_node(system_states)
+    # a symbolic link is removed itself, rather than what it points to
+    target_node = target_node_path.get_node(system_states, follow_links=False)
     # check if the target node exists
     if target_node is None:
         raise predefined_errors.NautilusException("No such file")
     # check if the target node is a file
-    if target_node.type != "file":
+    if target_node.type == "directory":
         raise predefined_errors.NautilusException("Is a directory")
     if not is_file_doable("w", target_node, system_states) or \
        not is_file_ancestors_doable("x", target_node, system_states) or \
        not is_file_doable("w", target_node.parent, system_states):
         raise predefined_errors.PermissionDenied
+    # refuse before anyone is told about the removal
+    target_node.parent.check_writable()
+    watch.emit(system_states, "remove", target_node)
+    accounting.release(system_states, target_node)
     target_node.parent = None
 
 
@@ -175,7 +284,7 @@ def cmd_rmdir(args: dict, system_states: dict):
     target_dir_path = FilePath(system_states, args["dir"])
     if not target_dir_path.validity:
         raise predefined_errors.InvalidSyntax
-    target_dir = target_dir_path.get_node(system_states)
+    target_dir = target_dir_path.get_node(system_states, follow_links=False)
     if target_dir is None:
         raise predefined_errors.FileNotFound
     if target_dir.type != "directory":
@@ -187,6 +296,9 @@ def cmd_rmdir(args: dict, system_states: dict):
         raise predefined_errors.NautilusException("Cannot remove pwd")
     if len(target_dir.children.keys()) > 0:
         raise predefined_errors.NautilusException("Directory not empty")
+    target_dir.parent.check_writable()
+    watch.emit(system_states, "remove", target_dir)
+    accounting.release(system_states, target_dir)
     target_dir.parent = None
 
 
@@ -268,6 +380,7 @@ def cmd_chmod(args: dict, system_states: dict):
                     perms = (owner_perms << 3) | others_perms
                 # combine new perms with original file type back
                 target_file.mode = masked_file_type | perms
+                watch.emit(system_states, "chmod", target_file)
         except predefined_errors.NautilusException as err:
             print("chmod: " + err.message)
         finally:
@@ -284,7 +397,7 @@ def cmd_adduser(args: dict, system_states: dict):
         raise predefined_errors.OperationNotPermitted
     if args["user"] in system_states["users"]:
         raise predefined_errors.NautilusException("The user already exists")
-    system_states["users"].add(args["user"])
+    versions.add_to_set(system_states["users"], args["user"])
 
 
 def cmd_deluser(args: dict, system_states: dict):
@@ -301,7 +414,9 @@ If you really want this, call deluser with parameter --force
 (but this `deluser` does not allow `--force`, haha)
 Stopping now without having performed any action""")
         return
-    system_states["users"].remove(args["user"])
+    versions.discard_from_set(system_states["users"], args["user"])
+    # the files of the user stay around (and counted), but the limits go with the account
+    versions.pop_item(system_states.get("quotas", {}), args["user"])
 
 
 def cmd_su(args: dict, system_states: dict):
@@ -327,19 +442,87 @@ def cmd_chown(args: dict, system_states: dict):
         raise predefined_errors.FileNotFound
     use_recursion = args.get("recursion", False)
     def chown(target_file: FileNode, new_user: str, recursion: bool):
+        old_owner = target_file.owner
         target_file.owner = new_user
+        accounting.transfer(system_states, target_file, old_owner)
+        watch.emit(system_states, "chown", target_file)
         if recursion:
             for child_node in target_file.children.values():
                 chown(child_node, new_user, True)
     chown(target_file, args["user"], use_recursion)
 
 
+def render_ls(entries: list, long_format: bool, json_output: bool, null_separated: bool):
+    """Write a whole listing to stdout at once.
+
+    Args:
+        entries (list): (name, node) pairs in the order to display
+        long_format (bool): prefix each name with its mode string and owner
+        json_output (bool): write a JSON array of objects instead of text lines
+        null_separated (bool): terminate each entry with a NUL character instead of a newline
+    """
+    if json_output:
+        sys.stdout.write(json.dumps([{
+            "name": name, "type": node.type, "mode": node.mode_string, "owner": node.owner,
+            **({"target": node.link_target} if node.link_target is not None else {})
+        } for name, node in entries]) + "\n")
+        return
+    if long_format:
+        lines = [f"{node.mode_string} {node.owner} {name}" if node.link_target is None
+                 else f"{node.mode_string} {node.owner} {name} -> {node.link_target}"
+                 for name, node in entries]
+    else:
+        lines = [name for name, node in entries]
+    if len(lines) > 0:
+        terminator = "\0" if null_separated else "\n"
+        sys.stdout.write(terminator.join(lines) + terminator)
+
+
+def walk_listing(label: str, directory: FileNode, list_all: bool, system_states: dict):
+    """Walk a directory tree for a recursive listing, one directory at a time.
+
+    Args:
+        label (str): The path of the directory as it should be shown
+        directory (FileNode): The top directory, which the caller has checked can be listed
+        list_all (bool): include hidden entries, and walk into hidden directories
+
+    Yields:
+        tuple: (label, entries) for every directory in the order to display, where entries are
+               (name, node) pairs; entries is None for a directory the effective user cannot list.
+    """
+    # the stack only holds the directories still to visit next to the current path, and whether
+    # the effective user can execute every ancestor of them, so nothing is checked twice
+    stack = [(label, directory, True)]
+    while len(stack) > 0:
+        label, directory, traversable = stack.pop()
+        if not traversable or not is_file_doable("r", directory, system_states):
+            yield label, None
+            continue
+        entries = sorted((name, node) for name, node in directory.children.items()
+                         if list_all or name[0] != ".")
+        if list_all:
+            entries = [(".", directory), ("..", directory.parent or directory)] + entries
+        yield label, entries
+        # symbolic links are listed but not followed
+        children_traversable = traversable and is_file_doable("x", directory, system_states)
+        prefix = label if label.endswith("/") else label + "/"
+        stack.extend((prefix + name, node, children_traversable) for name, node in reversed(entries)
+                     if node.type == "directory" and name != "." and name != "..")
+
+
 def cmd_ls(args: dict, system_states: dict):
     ls_requests = {}
     list_all = args.get("all", False)
     long_format = args.get("long", False)
     list_dir_itself = args.get("list_dir", False)
     path = args.get("path", ".")
+    # the machine-readable output modes are mutually exclusive
+    if args.get("json", False) and args.get("null", False):
+        raise predefined_errors.InvalidSyntax
+    # a recursive listing is written as it goes, in the text format only
+    recursive = args.get("recursive", False) and not list_dir_itself
+    if recursive and (args.get("json", False) or args.get("null", False)):
+        raise predefined_errors.InvalidSyntax
     target_file: FileNode = None
     parent: FileNode = None
     if path == ".":
@@ -365,6 +548,17 @@ def cmd_ls(args: dict, system_states: dict):
                 raise predefined_errors.PermissionDenied
             if list_all or path[0] != ".":
                 ls_requests[path] = target_file
+        elif recursive:
+            for index, (label, entries) in enumerate(walk_listing(path, target_file, list_all, system_states)):
+                # a blank line between the blocks of the directories
+                if index > 0:
+                    sys.stdout.write("\n")
+                sys.stdout.write(f"{label}:\n")
+                if entries is None:
+                    print(f"ls: cannot open directory {label}: Permission denied")
+                else:
+                    render_ls(entries, long_format, False, False)
+            return
         else:
             if list_all:
                 ls_requests["."] = target_file
@@ -378,17 +572,222 @@ def cmd_ls(args: dict, system_states: dict):
             raise predefined_errors.PermissionDenied
         if list_all or path[0] != ".":
             ls_requests[path] = target_file
-    for name, obj in sorted(ls_requests.items()):
-        char_set = ["x", "w", "r", "x", "w", "r", "d"]
-        if long_format:
-            for i in range(6, -1, -1):
-                if (obj.mode & 1 << i) >> i:
-                    print(char_set[i], end='')
-                else:
-                    print("-", end='')
-            print(" " + obj.owner + " " + name)
+    render_ls(sorted(ls_requests.items()), long_format,
+              args.get("json", False), args.get("null", False))
+
+
+def cmd_quota(args: dict, system_states: dict):
+    user = args.get("user", system_states["effective_user"])
+    if not string_validity_check(user):
+        raise predefined_errors.InvalidSyntax
+    if user not in system_states["users"]:
+        raise predefined_errors.NautilusException("Invalid user")
+    # other users' usage is only for the superuser to see
+    if system_states["effective_user"] != "root" and system_states["effective_user"] != user:
+        raise predefined_errors.OperationNotPermitted
+    if "files" in args:
+        # setting limits needs both of them; "none" stands for no limit
+        if "directories" not in args:
+            raise predefined_errors.InvalidSyntax
+        if system_states["effective_user"] != "root":
+            raise predefined_errors.OperationNotPermitted
+        limits = []
+        for limit in [args["files"], args["directories"]]:
+            if limit == "none":
+                limits.append(None)
+            elif limit.isdigit():
+                limits.append(int(limit))
+            else:
+                raise predefined_errors.NautilusException("Invalid limit")
+        accounting.set_quota(system_states, user, limits[0], limits[1])
+        return
+    usage = accounting.usage_of(system_states, user)
+    limits = system_states.get("quotas", {}).get(user, {})
+    def describe(file_type: str) -> str:
+        limit = limits.get(file_type)
+        return f"{usage[file_type]}/{'none' if limit is None else limit}"
+    print(f"{user}: files {describe('file')}, directories {describe('directory')}")
+
+
+def diff_snapshots(args: dict, system_states: dict) -> list:
+    # compare two snapshots, or a snapshot and the current state when only one is named
+    tree = version_tree(system_states)
+    compared = []
+    for name in [args["old"], args.get("new")]:
+        if name is None:
+            compared.append(tree.current)
+        elif name not in tree.snapshots:
+            raise predefined_errors.NautilusException("No such snapshot")
         else:
-            print(name)
+            compared.append(tree.snapshots[name][0])
+    return diff_versions(system_states["root"], tree, compared[0], compared[1])
+
+
+def cmd_diff(args: dict, system_states: dict):
+    if args.get("snapshots", False):
+        changes = diff_snapshots(args, system_states)
+        if len(changes) > 0:
+            sys.stdout.write("\n".join(f"{change} {path}" for path, change in changes) + "\n")
+        return
+    if args.get("new") is None:
+        raise predefined_errors.InvalidSyntax
+    nodes = []
+    for path in [args["old"], args["new"]]:
+        file_path = FilePath(system_states, path)
+        if not file_path.validity:
+            raise predefined_errors.InvalidSyntax
+        node = file_path.get_node(system_states)
+        if node is None:
+            raise predefined_errors.FileNotFound
+        if not is_file_doable("r", node, system_states) \
+           or not is_file_ancestors_doable("x", node, system_states):
+            raise predefined_errors.PermissionDenied
+        nodes.append(node)
+    # only look into directories that the effective user could list on both sides
+    def can_descend(old_dir: FileNode, new_dir: FileNode) -> bool:
+        return all(is_file_doable("r", directory, system_states)
+                   and is_file_doable("x", directory, system_states) for directory in [old_dir, new_dir])
+    lines = [f"{change} {path}" for path, change in diff_trees(nodes[0], nodes[1], can_descend)]
+    if len(lines) > 0:
+        sys.stdout.write("\n".join(lines) + "\n")
+
+
+def cmd_access_audit(args: dict, system_states: dict):
+    # what other users can get to is only for the superuser to see
+    if system_states["effective_user"] != "root":
+        raise predefined_errors.OperationNotPermitted
+    target_path = FilePath(system_states, args["path"])
+    if not target_path.validity:
+        raise predefined_errors.InvalidSyntax
+    target = target_path.get_node(system_states)
+    if target is None:
+        raise predefined_errors.FileNotFound
+    permissions = "".join(permission for permission, name in [("r", "read"), ("w", "write"), ("x", "execute")]
+                          if args.get(name, False))
+    user = args.get("user")
+    if user is not None and user not in system_states["users"]:
+        raise predefined_errors.NautilusException("Invalid user")
+    if len(permissions) == 0:
+        for audited_user, counts in audit(system_states, target).items():
+            if user is None or audited_user == user:
+                print(f"{audited_user}: read {counts['r']}, write {counts['w']}, "
+                      f"execute {counts['x']} of {counts['total']}")
+        return
+    # list the paths themselves; the superuser can do anything, so it is only listed when named
+    users = [user] if user is not None else sorted(system_states["users"] - {"root"})
+    words = {"r": "read", "w": "write", "x": "execute"}
+    for audited_user, allowed in allowed_nodes(system_states, target, permissions, users).items():
+        for permission, nodes in allowed.items():
+            for path in sorted(str(FilePath.from_node(system_states, node)) for node in nodes):
+                print(f"{audited_user} {words[permission]} {path}")
+
+
+def cmd_memstat(args: dict, system_states: dict):
+    # a sampled walk measures one in every 100 nodes and scales the figures up
+    sample_stride = 100 if args.get("sampled", False) else 1
+    report = measure_footprint(system_states, sample_stride)
+    total = 0
+    for category in ["nodes", "children", "names", "owners", "node_caches", "indexes"]:
+        count, size = report[category]
+        total += size
+        print(f"{category}: {count} objects, {size} bytes")
+    print(f"total: {total} bytes, {total / report['node_count']:.1f} bytes per node")
+
+
+def version_tree(system_states: dict) -> versions.VersionTree:
+    # going back and forth between versions of the whole system is for the superuser
+    if system_states["effective_user"] != "root":
+        raise predefined_errors.OperationNotPermitted
+    tree = system_states.get("versions")
+    if tree is None:
+        raise predefined_errors.NautilusException("Versions are not kept")
+    return tree
+
+
+def settle_after_restore(system_states: dict, pwd: FileNode):
+    # stay in the working directory if it still exists, otherwise go back to the root directory
+    root: FileNode = system_states["root"]
+    if pwd is not root and root not in pwd.ancestors:
+        pwd = root
+    system_states["pwd"] = pwd
+    # let watchers (such as published images) know that anything may have changed
+    watch.emit(system_states, "restore", root)
+
+
+def cmd_snapshot(args: dict, system_states: dict):
+    tree = version_tree(system_states)
+    name = args.get("name")
+    if name is None:
+        for snapshot_name in sorted(tree.snapshots):
+            print(snapshot_name)
+        return
+    if not string_validity_check(name):
+        raise predefined_errors.InvalidSyntax
+    if args.get("drop", False):
+        if name not in tree.snapshots:
+            raise predefined_errors.NautilusException("No such snapshot")
+        tree.drop(name)
+        return
+    tree.snapshot(name, system_states["pwd"])
+
+
+def cmd_restore(args: dict, system_states: dict):
+    tree = version_tree(system_states)
+    if args["name"] not in tree.snapshots:
+        raise predefined_errors.NautilusException("No such snapshot")
+    settle_after_restore(system_states, tree.restore(args["name"]))
+
+
+def cmd_undo(args: dict, system_states: dict):
+    if not version_tree(system_states).undo():
+        raise predefined_errors.NautilusException("Nothing to undo")
+    settle_after_restore(system_states, system_states["pwd"])
+
+
+def cmd_redo(args: dict, system_states: dict):
+    if not version_tree(system_states).redo():
+        raise predefined_errors.NautilusException("Nothing to redo")
+    settle_after_restore(system_states, system_states["pwd"])
+
+
+def print_events(events: list):
+    # stream the changes under a path watched with the watch command
+    for event in events:
+        if event.old_path is not None:
+            print(f"{event.kind} {event.old_path} -> {event.path}")
+        else:
+            print(f"{event.kind} {event.path}")
+
+
+def cmd_watch(args: dict, system_states: dict):
+    target_path = FilePath(system_states, args["path"])
+    if not target_path.validity:
+        raise predefined_errors.InvalidSyntax
+    target = target_path.get_node(system_states)
+    if target is None:
+        raise predefined_errors.FileNotFound
+    if not is_file_doable("r", target, system_states) \
+       or not is_file_ancestors_doable("x", target, system_states):
+        raise predefined_errors.PermissionDenied
+    # events are printed in batches after each command, and while a burst of them goes on;
+    # the watching user only hears about changes in directories they could list at the time
+    watch.subscribe(system_states, target, print_events, batch_size=1000,
+                    user=system_states["effective_user"])
+
+
+def cmd_unwatch(args: dict, system_states: dict):
+    target_path = FilePath(system_states, args["path"])
+    if not target_path.validity:
+        raise predefined_errors.InvalidSyntax
+    target = target_path.get_node(system_states)
+    if target is None:
+        raise predefined_errors.FileNotFound
+    subscriptions = [subscription for subscription in system_states.get("watches", {}).get(target, [])
+                     if subscription.callback is print_events]
+    if len(subscriptions) == 0:
+        raise predefined_errors.NautilusException("Not watched")
+    for subscription in subscriptions:
+        watch.unsubscribe(system_states, subscription)
 
 
 router = {
@@ -440,6 +839,16 @@ router = {
             "name": "dst", "type": "string"
         }]
     },
+    "ln": {
+        "method": cmd_ln,
+        "parameters": [{
+            "name": "symbolic", "type": "option", "indicator": "s"
+        }, {
+            "name": "target", "type": "string"
+        }, {
+            "name": "link", "type": "string"
+        }]
+    },
     "rm": {
         "method": cmd_rm,
         "parameters": [{
@@ -496,10 +905,90 @@ router = {
             "name": "all", "type": "option", "indicator": "a"
         }, {
             "name": "list_dir", "type": "option", "indicator": "d"
+        }, {
+            "name": "recursive", "type": "option", "indicator": "R"
         }, {
             "name": "long", "type": "option", "indicator": "l"
+        }, {
+            "name": "json", "type": "option", "indicator": "-json"
+        }, {
+            "name": "null", "type": "option", "indicator": "-null"
         }, {
             "name": "path", "type": "string", "optional": True
         }]
+    },
+    "watch": {
+        "method": cmd_watch,
+        "parameters": [{
+            "name": "path", "type": "string"
+        }]
+    },
+    "unwatch": {
+        "method": cmd_unwatch,
+        "parameters": [{
+            "name": "path", "type": "string"
+        }]
+    },
+    "snapshot": {
+        "method": cmd_snapshot,
+        "parameters": [{
+            "name": "drop", "type": "option", "indicator": "d"
+        }, {
+            "name": "name", "type": "string", "optional": True
+        }]
+    },
+    "restore": {
+        "method": cmd_restore,
+        "parameters": [{
+            "name": "name", "type": "string"
+        }]
+    },
+    "undo": {
+        "method": cmd_undo,
+        "parameters": []
+    },
+    "redo": {
+        "method": cmd_redo,
+        "parameters": []
+    },
+    "quota": {
+        "method": cmd_quota,
+        "parameters": [{
+            "name": "user", "type": "string", "optional": True
+        }, {
+            "name": "files", "type": "string", "optional": True
+        }, {
+            "name": "directories", "type": "string", "optional": True
+        }]
+    },
+    "diff": {
+        "method": cmd_diff,
+        "parameters": [{
+            "name": "snapshots", "type": "option", "indicator": "s"
+        }, {
+            "name": "old", "type": "string"
+        }, {
+            "name": "new", "type": "string", "optional": True
+        }]
+    },
+    "access-audit": {
+        "method": cmd_access_audit,
+        "parameters": [{
+            "name": "read", "type": "option", "indicator": "r"
+        }, {
+            "name": "write", "type": "option", "indicator": "w"
+        }, {
+            "name": "execute", "type": "option", "indicator": "x"
+        }, {
+            "name": "path", "type": "string"
+        }, {
+            "name": "user", "type": "string", "optional": True
+        }]
+    },
+    "memstat": {
+        "method": cmd_memstat,
+        "parameters": [{
+            "name": "sampled", "type": "option", "indicator": "s"
+        }]
     }
 }
@@ -0,0 +1,82 @@
+import builtin_commands
+from file_system import FileNode, FilePath
+from predefined_errors import NautilusException
+from utilities import is_file_doable, is_file_ancestors_doable
+
+
+class Completer:
+    def __init__(self, system_states: dict):
+        """Return a readline completer for command names and paths.
+
+        Args:
+            system_states (dict): The address of the set of system states
+        """
+        self.system_states = system_states
+        self.matches = []
+
+    def candidates(self, line: str, begidx: int, text: str) -> list[str]:
+        """Get every completion of the word being typed.
+
+        Args:
+            line (str): The whole input line so far
+            begidx (int): The position where the word being completed starts
+            text (str): The word being completed
+
+        Returns:
+            list[str]: Command names if the word is the first one in the line, otherwise paths.
+        """
+        if len(line[:begidx].strip()) == 0:
+            return sorted(cmd + " " for cmd in builtin_commands.router if cmd.startswith(text))
+        # split the word into the directory to look in and the prefix of the last level
+        prefix = text.rpartition("/")[2]
+        head = text[:len(text) - len(prefix)]
+        if len(head) == 0:
+            directory: FileNode = self.system_states["pwd"]
+        else:
+            dir_path = FilePath(self.system_states, head, semantical_check=True)
+            if dir_path.semantical_status != "success":
+                return []
+            directory = dir_path.get_node(self.system_states)
+        # only offer what the effective user could see with ls
+        if directory.type != "directory" \
+           or not is_file_doable("r", directory, self.system_states) \
+           or not is_file_ancestors_doable("x", directory, self.system_states):
+            return []
+        matches = []
+        for name in directory.names_with_prefix(prefix):
+            # complete symbolic links to directories like directories
+            try:
+                target = directory.children[name].follow(self.system_states)
+            except NautilusException:
+                target = None
+            if target is not None and target.type == "directory":
+                matches.append(head + name + "/")
+            else:
+                matches.append(head + name + " ")
+        return matches
+
+    def complete(self, text: str, state: int) -> str:
+        # readline asks for the matches one by one, starting from state 0
+        if state == 0:
+            import readline
+            self.matches = self.candidates(readline.get_line_buffer(), readline.get_begidx(), text)
+        if state < len(self.matches):
+            return self.matches[state]
+        return None
+
+
+def install(system_states: dict) -> bool:
+    """Enable tab completion for the interactive shell.
+
+    Returns:
+        bool: False if readline is not available on this platform.
+    """
+    try:
+        import readline
+    except ImportError:
+        return False
+    readline.set_completer(Completer(system_states).complete)
+    # paths may contain every character but spaces
+    readline.set_completer_delims(" ")
+    readline.parse_and_bind("tab: complete")
+    return True
@@ -0,0 +1,70 @@
+'''
+Check the access audit against the permission helpers that the commands use: for every
+user and node of a random tree, the counts and the listed nodes must match what
+is_file_doable and is_file_ancestors_doable say.
+
+Usage: python e2e_tests/check_access_audit.py
+'''
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import nautilus
+from access_audit import allowed_nodes, audit
+from file_system import FileNode
+from utilities import is_file_doable, is_file_ancestors_doable
+
+
+def build(system_states: dict, users: list[str]) -> FileNode:
+    # random modes and owners (including an owner that is no longer a user), and a link
+    top = FileNode("audit", 0b1111101, "root", system_states["root"])
+    directories = [top]
+    for i in range(300):
+        is_directory = random.random() < 0.3
+        mode = (0b1000000 if is_directory else 0) | random.getrandbits(6)
+        node = FileNode(f"n{i}", mode, random.choice(users + ["gone"]), random.choice(directories))
+        if is_directory:
+            directories.append(node)
+    FileNode("link", 0b0111111, "root", top, link_target="/audit/n0")
+    return top
+
+
+def main():
+    random.seed(0)
+    system_states = nautilus.init()
+    users = ["root", "alice", "bob", "carol"]
+    system_states["users"] = set(users)
+    top = build(system_states, users)
+    nodes = []
+    stack = [top]
+    while len(stack) > 0:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.children.values())
+    counts = audit(system_states, top)
+    listed = allowed_nodes(system_states, top, "rwx")
+    mismatches = 0
+    for user in sorted(users):
+        system_states["effective_user"] = user
+        expected = {"r": set(), "w": set(), "x": set()}
+        for node in nodes:
+            if is_file_ancestors_doable("x", node, system_states):
+                for permission in "rwx":
+                    if is_file_doable(permission, node, system_states):
+                        expected[permission].add(node)
+        for permission in "rwx":
+            if counts[user][permission] != len(expected[permission]) \
+               or set(listed[user][permission]) != expected[permission]:
+                mismatches += 1
+                print(f"{user} {permission}: audit counted {counts[user][permission]} and listed "
+                      f"{len(listed[user][permission])}, expected {len(expected[permission])}")
+        print(f"{user}: read {len(expected['r'])}, write {len(expected['w'])}, "
+              f"execute {len(expected['x'])} of {len(nodes)}")
+    system_states["effective_user"] = "root"
+    print(f"{len(nodes)} nodes, {len(users)} users, {mismatches} mismatches")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+'''
+Check tab completion: command names, nested paths, symbolic links to directories (completed
+like directories), directories the effective user cannot list, and a wide directory whose
+sorted name index is kept up to date while files come and go.
+
+Usage: python e2e_tests/check_completion.py
+'''
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import nautilus
+from completion import Completer
+from file_system import SortedNames
+
+SETUP = """adduser bob
+mkdir -p /home/bob/docs/drafts
+touch /home/bob/docs/draft-1
+touch /home/bob/docs/notes
+ln -s /home/bob/docs /home/bob/d
+ln -s /home/bob/docs/notes /home/bob/n
+ln -s /nowhere /home/bob/dangling
+mkdir /home/bob/private
+touch /home/bob/private/key
+chown -r bob /home/bob
+chmod o-r /home/bob/private
+mkdir /wide"""
+
+
+def run(system_states: dict, line: str):
+    with redirect_stdout(io.StringIO()):
+        nautilus.run(line, system_states)
+
+
+def complete(system_states: dict, line: str) -> list[str]:
+    # complete the last word of the line, as readline would
+    begidx = line.rfind(" ") + 1
+    return Completer(system_states).candidates(line, begidx, line[begidx:])
+
+
+def main():
+    system_states = nautilus.init()
+    for line in SETUP.splitlines():
+        run(system_states, line)
+    run(system_states, "adduser alice")
+    for user in ["root", "alice"]:
+        run(system_states, f"su {user}")
+        for line in ["", "l", "mk", "qu", "ls /ho", "ls /home/bob/", "ls /home/bob/docs/dr",
+                     "cd /home/bob/d", "cd /home/bob/d/", "ls /home/bob/private/", "ls /home/bob/p",
+                     "ls /home/bob/n", "ls /home/bob/da", "ls /nope/", "ls /home/bob/docs/notes/"]:
+            print(f"{user} {line!r}: {complete(system_states, line)}")
+        run(system_states, "su")
+    # a directory wider than a chunk of the index, completed before and after changes
+    SortedNames.CHUNK_SIZE = 4
+    for i in range(20):
+        run(system_states, f"touch /wide/f{i:02d}")
+    print(f"wide 'ls /wide/f1': {complete(system_states, 'ls /wide/f1')}")
+    for line in ["rm /wide/f12", "rm /wide/f10", "touch /wide/f1a", "touch /wide/f19x", "mkdir /wide/f1d",
+                 "rm /wide/f00", "rm /wide/f01", "rm /wide/f02", "rm /wide/f03"]:
+        run(system_states, line)
+    print(f"wide 'ls /wide/f1': {complete(system_states, 'ls /wide/f1')}")
+    print(f"wide 'ls /wide/f0': {complete(system_states, 'ls /wide/f0')}")
+    expected = sorted(system_states["root"].children["wide"].children)
+    print(f"wide index in order: {system_states['root'].children['wide'].names_with_prefix('') == expected}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+'''
+Check the memory report: the categories add up to the total that memstat prints, exact and
+sampled walks agree on uniform trees and on trees whose subtrees differ, caches that are not
+set are not counted, and nothing is counted twice when virtual directories lead back to the
+system states.
+
+Usage: python e2e_tests/check_memstat.py
+'''
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import nautilus
+import virtual
+from file_system import FileNode
+from memory_stats import measure_footprint
+
+CATEGORIES = ["nodes", "children", "names", "owners", "node_caches", "indexes"]
+
+
+def build(parent: FileNode, name: str, fanout: int, depth: int, name_length: int = 4) -> FileNode:
+    # a balanced tree of directories, with files at the bottom
+    top = FileNode(name, 0b1111101, "root", parent)
+    level = [top]
+    for current_depth in range(depth):
+        mode = 0b1111101 if current_depth < depth - 1 else 0b0110100
+        level = [FileNode(f"{i:0{name_length}d}", mode, "root", node) for node in level for i in range(fanout)]
+    return top
+
+
+def agree(exact: dict, sampled: dict, categories: list, tolerance: float) -> bool:
+    return all(abs(sampled[category][1] - exact[category][1]) <= tolerance * exact[category][1]
+               for category in categories)
+
+
+def main():
+    # the categories add up to what memstat prints as the total
+    system_states = nautilus.init()
+    build(system_states["root"], "tree", 10, 3)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        nautilus.run("memstat", system_states)
+    lines = output.getvalue().splitlines()
+    # "CATEGORY: N objects, M bytes", then "total: M bytes, B bytes per node"
+    printed = {line.split(":")[0]: int(line.split(", ")[0 if line.startswith("total") else 1].split()[-2])
+               for line in lines}
+    report = measure_footprint(system_states)
+    print(f"categories add up to the total: {sum(printed[category] for category in CATEGORIES) == printed['total']}")
+    print(f"memstat prints the report: {all(printed[category] == report[category][1] for category in CATEGORIES)}")
+    # nothing has been hashed or followed, so no node has a cache set
+    print(f"unset caches: {report['node_caches'][0]} objects, {report['node_caches'][1]} bytes")
+    # exact and sampled walks agree on a uniform tree
+    system_states = nautilus.init()
+    for i in range(5000):
+        build(system_states["root"], f"d{i}", 10, 1)
+    exact, sampled = measure_footprint(system_states), measure_footprint(system_states, 100)
+    print(f"uniform tree: {exact['node_count']} nodes, agree within 10%: {agree(exact, sampled, CATEGORIES, 0.1)}")
+    # and on a tree with a subtree of long names and a subtree of short names
+    system_states = nautilus.init()
+    build(system_states["root"], "long", 30, 3, name_length=200)
+    build(system_states["root"], "short", 30, 3, name_length=1)
+    exact, sampled = measure_footprint(system_states), measure_footprint(system_states, 100)
+    print(f"mixed tree: names agree within 10%: {agree(exact, sampled, ['names'], 0.1)}")
+    # the mount of a virtual directory leads back to the system states, which are counted
+    # under the indexes only: a longer history makes the indexes grow, not the node caches
+    system_states = nautilus.init()
+    virtual.mount_proc(system_states)
+    build(system_states["root"], "tree", 10, 3)
+    with redirect_stdout(io.StringIO()):
+        nautilus.run("ls -R /proc", system_states)
+        before = measure_footprint(system_states)
+        for i in range(50):
+            nautilus.run(f"touch /tree/f{i}", system_states)
+            nautilus.run(f"rm /tree/f{i}", system_states)
+    after = measure_footprint(system_states)
+    # (small shared objects such as interned strings may move from one category to the other)
+    print(f"with /proc and a longer history: node caches within 1KB "
+          f"{abs(after['node_caches'][1] - before['node_caches'][1]) < 1024}, "
+          f"indexes grew by over 10KB {after['indexes'][1] - before['indexes'][1] > 10240}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+'''
+Check that a recorded session replays with no mismatches, from fresh states and from saved
+ones, and that saving states works for deep trees and for states holding watches and
+published images.
+
+Usage: python e2e_tests/check_replay.py
+'''
+import io
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import nautilus
+import replay
+import shared_image
+import watch
+from file_system import FileNode
+from session_trace import TraceRecorder
+
+SESSION = """mkdir -p /home/alice/docs
+adduser alice
+chown -r alice /home/alice
+touch /home/alice/docs/a
+ln -s /home/alice/docs /d
+quota alice 10 none
+cd /d
+ls -l
+su alice
+touch b
+ls -a -l /home/alice/docs
+mv /home/alice/docs/b /home/alice/c
+rm /home/alice/c
+rmdir /home
+nosuchcommand
+su
+undo
+ls /home/alice/docs
+pwd"""
+
+
+def record(system_states: dict, trace_path: str, lines: list[str]):
+    system_states["recorder"] = TraceRecorder(trace_path)
+    with redirect_stdout(io.StringIO()):
+        for line in lines:
+            nautilus.run(line, system_states)
+    system_states["recorder"].close()
+    del system_states["recorder"]
+
+
+def report(label: str, result: dict):
+    print(f"{label}: {result['commands']} commands, {len(result['mismatches'])} mismatches")
+    for index, command, difference in result["mismatches"]:
+        print(f"  {index + 1}: {command}: {difference}")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        # a session from fresh states, recorded to a compressed trace
+        trace_path = os.path.join(directory, "session.jsonl.gz")
+        record(nautilus.init(), trace_path, SESSION.splitlines())
+        report("fresh", replay.replay_trace(trace_path))
+        # a session that starts from saved states, with a watch and a published image around
+        system_states = nautilus.init()
+        with redirect_stdout(io.StringIO()):
+            for line in SESSION.splitlines()[:7]:
+                nautilus.run(line, system_states)
+        watch.subscribe(system_states, system_states["root"], lambda event: None)
+        publisher = shared_image.ImagePublisher(system_states)
+        state_path = os.path.join(directory, "state.pickle")
+        replay.save_state(system_states, state_path)
+        publisher.close()
+        trace_path = os.path.join(directory, "saved.jsonl")
+        record(replay.load_state(state_path), trace_path, SESSION.splitlines()[7:])
+        report("saved", replay.replay_trace(trace_path, state_path=state_path))
+        # a tree deeper than the recursion limit
+        system_states = nautilus.init()
+        node = system_states["root"]
+        for i in range(5000):
+            node = FileNode(f"d{i}", 0b1111101, "root", node)
+        replay.save_state(system_states, state_path)
+        loaded = replay.load_state(state_path)
+        depth = 0
+        node = loaded["root"]
+        while len(node.children) > 0:
+            node = node.children[f"d{depth}"]
+            depth += 1
+        print(f"deep: {depth} levels, {loaded['usage']['root']['directory']} directories counted")
+
+
+if __name__ == '__main__':
+    main()
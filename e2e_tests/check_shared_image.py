@@ -0,0 +1,80 @@
+'''
+Check that read-only commands answered from a shared tree image print exactly what the
+builtin commands print, on a tree with links, permissions and non-ASCII names.
+
+Usage: python e2e_tests/check_shared_image.py
+'''
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import nautilus
+import shared_image
+from file_system import FilePath
+
+SETUP = """adduser bob
+mkdir -p /home/bob/café
+touch /home/bob/café/menü
+touch /home/bob/.hidden
+mkdir /srv
+chmod o-r /srv
+mkdir /srv/data
+touch /srv/data/x
+ln -s /home/bob/café /home/bob/link
+ln -s /nowhere /home/bob/dangling
+ln -s ../srv/data /home/up
+chown -r bob /home/bob
+chmod o-x /home/bob/café"""
+
+QUERIES = ["ls", "ls -a", "ls -l", "ls -l -a", "ls -d", "ls -a -d", "ls /home", "ls -l /home",
+           "ls /home/bob", "ls -a -l /home/bob", "ls /home/bob/café", "ls -l /home/bob/café/menü",
+           "ls /home/bob/link", "ls -l /home/bob/link", "ls /home/bob/link/..", "ls /home/bob/dangling",
+           "ls /srv", "ls -d /srv", "ls /srv/data", "ls /home/up", "ls -l /home/up/x", "ls /missing",
+           "ls -x", "ls a b", "cd /home/bob", "cd /home/bob/café", "cd /home/bob/link",
+           "cd /home/bob/link/..", "cd /home/bob/café/menü", "cd /srv/data", "cd ..", "cd /missing",
+           "", "   "]
+
+
+def builtin_output(system_states: dict, user: str, pwd: str, line: str) -> str:
+    system_states["effective_user"] = user
+    system_states["pwd"] = FilePath(system_states, pwd).get_node(system_states)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        nautilus.run(line.strip(), system_states)
+    # cd prints nothing, so compare where it lands instead
+    if line.split()[:1] == ["cd"] and output.getvalue() == "":
+        return str(FilePath.from_node(system_states, system_states["pwd"])) + "\n"
+    return output.getvalue()
+
+
+def main():
+    system_states = nautilus.init()
+    with redirect_stdout(io.StringIO()):
+        for line in SETUP.splitlines():
+            nautilus.run(line, system_states)
+    segment = shared_image.publish(system_states)
+    image = shared_image.TreeImage(segment.name, track=True)
+    mismatches = 0
+    checked = 0
+    try:
+        for user in ["root", "bob"]:
+            for pwd in ["/", "/home/bob"]:
+                for line in QUERIES:
+                    expected = builtin_output(system_states, user, pwd, line)
+                    actual = shared_image.run_query(image, user, pwd, line)
+                    checked += 1
+                    if expected != actual:
+                        mismatches += 1
+                        print(f"{user} {pwd} {line!r}: expected {expected!r}, got {actual!r}")
+    finally:
+        image.close()
+        segment.close()
+        segment.unlink()
+    print(f"{checked} queries, {mismatches} mismatches")
+
+
+if __name__ == '__main__':
+    main()
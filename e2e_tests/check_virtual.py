@@ -0,0 +1,93 @@
+'''
+Check virtual directories: children are produced on first access, least recently used
+directories are evicted (but not modified ones), listings are produced again when their
+version changes (but not the ones of modified directories, which undo still refers to), and
+read-only providers refuse every change.
+
+Usage: python e2e_tests/check_virtual.py
+'''
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import nautilus
+import predefined_errors
+import virtual
+
+
+class NumbersProvider(virtual.ChildrenProvider):
+    # /numbers/N holds N directories, each holding a file per digit of its number
+    def __init__(self, size: list, read_only: bool = False, digits: str = None):
+        self.size = size
+        self.read_only = read_only
+        self.digits = digits
+        self.listed = 0
+
+    def list_children(self, node) -> list[virtual.VirtualEntry]:
+        self.listed += 1
+        if self.digits is not None:
+            return [virtual.VirtualEntry(f"digit{digit}", 0b0110100, "root") for digit in self.digits]
+        return [virtual.VirtualEntry(f"n{i}", 0b1111101, "root", NumbersProvider(self.size, self.read_only, str(i)))
+                for i in range(self.size[0])]
+
+    def version(self, node) -> object:
+        return self.size[0] if self.digits is None else None
+
+
+def run(system_states: dict, line: str) -> str:
+    output = io.StringIO()
+    with redirect_stdout(output):
+        nautilus.run(line, system_states)
+    return output.getvalue().strip().replace("\n", " ")
+
+
+def main():
+    system_states = nautilus.init()
+    size = [12]
+    provider = NumbersProvider(size)
+    mount = virtual.mount(system_states, "/numbers", provider, capacity=4)
+    node = system_states["root"].children["numbers"]
+    print(f"before access: {len(node._children)} children in memory, listed {provider.listed} time(s)")
+    print(f"ls /numbers/n11: {run(system_states, 'ls /numbers/n11')}")
+    print(f"after access: {len(node._children)} children in memory, listed {provider.listed} time(s)")
+    # walking every directory keeps at most `capacity` of them materialized
+    for i in range(12):
+        run(system_states, f"ls /numbers/n{i}")
+    materialized = [name for name, child in node._children.items() if child._virtual.materialized]
+    print(f"after listing all: {len(mount.lru)} in the LRU, materialized {' '.join(materialized)}")
+    print(f"ls /numbers/n3 again: {run(system_states, 'ls /numbers/n3')}")
+    # a new version of the listing produces the children again
+    size[0] = 3
+    print(f"after the version changed: {run(system_states, 'ls /numbers')}")
+    size[0] = 12
+    run(system_states, "ls /numbers")
+    # a directory changed by a user is never evicted
+    run(system_states, "touch /numbers/n5/mine")
+    for i in range(12):
+        run(system_states, f"ls /numbers/n{i}")
+    print(f"modified and pinned: {run(system_states, 'ls /numbers/n5')}")
+    # nor listed again, so what users made stays there for undo to take back
+    run(system_states, "touch /numbers/mine")
+    size[0] = 3
+    print(f"modified, after the version changed: {run(system_states, 'ls /numbers')}")
+    print(f"undo: {run(system_states, 'undo')}{run(system_states, 'ls /numbers')}")
+    # read-only providers refuse every change, and watchers are not told about refusals
+    read_only = NumbersProvider([2], read_only=True)
+    virtual.mount(system_states, "/fixed", read_only)
+    run(system_states, "watch /fixed")
+    for line in ["touch /fixed/n0/x", "mkdir /fixed/d", "rm /fixed/n0/digit0", "rmdir /fixed/n1",
+                 "chmod a+w /fixed/n0/digit0", "chown root /fixed/n1", "mv /fixed/n0/digit0 /moved"]:
+        print(f"{line}: {run(system_states, line)}")
+    print(f"ls -R /fixed: {run(system_states, 'ls -R /fixed')}")
+    try:
+        system_states["root"].children["fixed"].children["n0"].mode = 0b1111111
+        print("setting a mode directly: allowed")
+    except predefined_errors.ReadOnlyFileSystem:
+        print("setting a mode directly: refused")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,95 @@
 
+from bisect import bisect_left, insort
+from hashlib import blake2b
+import predefined_errors
+import versions
 from utilities import string_validity_check
 
+# precomputed "drwxrwx" strings for every possible 7-bit mode, indexed by the mode itself
+MODE_STRINGS: tuple[str] = tuple(
+    "".join(char if mode & 1 << i else "-" for i, char in reversed(list(enumerate("xwrxwrd"))))
+    for mode in range(1 << 7)
+)
+# how many symbolic links a single lookup may follow before it is considered a loop
+MAX_LINK_HOPS = 40
+# the digests of the children of a directory are added up modulo 2 ** 128
+DIGEST_MASK = (1 << 128) - 1
+
+
+def child_digest(child: object) -> int:
+    # what a child adds to the hash of its parent: a digest of its name and its own hash
+    digest = blake2b(child.name.encode() + b"\0" + child._hash, digest_size=16)
+    return int.from_bytes(digest.digest(), "big")
+
+
+class SortedNames:
+    # how many names a chunk holds when the index is built; a chunk is split at twice that
+    CHUNK_SIZE = 1000
+
+    def __init__(self, names):
+        """Return a sorted index of names, kept as a list of sorted chunks so that adding or
+        removing a name only shifts the names of one chunk.
+
+        Args:
+            names: The names to index, in any order
+        """
+        names = sorted(names)
+        self._chunks = [names[i:i + self.CHUNK_SIZE] for i in range(0, len(names), self.CHUNK_SIZE)]
+        # the last name of every chunk, to find the chunk a name belongs to
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+
+    def add(self, name: str):
+        if len(self._chunks) == 0:
+            self._chunks.append([name])
+            self._maxes.append(name)
+            return
+        # names beyond the last chunk go to the end of it
+        index = min(bisect_left(self._maxes, name), len(self._chunks) - 1)
+        chunk = self._chunks[index]
+        insort(chunk, name)
+        self._maxes[index] = chunk[-1]
+        if len(chunk) > 2 * self.CHUNK_SIZE:
+            self._chunks[index:index + 1] = [chunk[:self.CHUNK_SIZE], chunk[self.CHUNK_SIZE:]]
+            self._maxes[index:index + 1] = [chunk[self.CHUNK_SIZE - 1], chunk[-1]]
+
+    def remove(self, name: str):
+        index = bisect_left(self._maxes, name)
+        chunk = self._chunks[index]
+        del chunk[bisect_left(chunk, name)]
+        if len(chunk) == 0:
+            del self._chunks[index]
+            del self._maxes[index]
+        else:
+            self._maxes[index] = chunk[-1]
+
+    def between(self, low: str, high: str) -> list[str]:
+        """Get the names from low (included) up to high (excluded), in sorted order."""
+        result = []
+        for index in range(bisect_left(self._maxes, low), len(self._chunks)):
+            chunk = self._chunks[index]
+            start = bisect_left(chunk, low)
+            end = bisect_left(chunk, high, start)
+            result.extend(chunk[start:end])
+            if end < len(chunk):
+                break
+        return result
+
+
 class FileNode:
     name: str
-    mode: int
-    owner: str
+    _mode: int
+    _owner: str
     _parent: object
-    children: dict[object]
-    def __init__(self, name: str, mode: int, owner: str, parent: object):
+    _children: dict[object]
+    link_target: str
+    _sorted_names: SortedNames
+    _link_cache: tuple
+    _virtual: object
+    _hash: bytes
+    _digest_sum: int
+    _contribution: int
+    _stale_children: set
+    def __init__(self, name: str, mode: int, owner: str, parent: object, link_target: str = None):
         """Return a new node of file.
         Args:
             name (str): The name of the file.
@@ -15,19 +97,66 @@ class FileNode:
                         it is "-" if the file is a non-directory.
             mode (int): The mode of the file, which is represented by a 7-bit binary number.
             parent: The parent node of the file, which is also an instance of the class File.
+            link_target (str): The path a symbolic link points to; None for other files.
         """
+        # hash of the subtree, recomputed on demand after it is invalidated by a change
+        self._hash = None
+        # sum of what the children add to the hash (None until the first hash, which adds up
+        # every child), and the children to add in again since the last hash
+        self._digest_sum = None
+        self._stale_children = None
+        # what this node adds to the hash of its parent; None if the parent has not added it yet
+        self._contribution = None
         self.name = name
-        self.mode = mode
-        self.owner = owner
+        self._mode = mode
+        self._owner = owner
         self._parent = parent
-        self.children = dict()
+        self._children = dict()
+        self.link_target = link_target
+        # the provider state of a directory whose children are produced on demand (see virtual.py)
+        self._virtual = None
+        # (lookups, resolved node, chain length) of the last time the link was followed
+        self._link_cache = None
+        # sorted index of children names, built on the first prefix lookup
+        self._sorted_names = None
         if parent is not None:
-            parent.children[name] = self
+            parent._attach_child(self)
 
     @property
     def parent(self) -> object:
         return self._parent
 
+    @property
+    def mode(self) -> int:
+        return self._mode
+
+    @mode.setter
+    def mode(self, new_mode: int):
+        if self._parent is not None:
+            self._parent.check_writable()
+        versions.record(("attr", self, "mode", self._mode, new_mode))
+        self._mode = new_mode
+        self.invalidate_hash()
+
+    @property
+    def owner(self) -> str:
+        return self._owner
+
+    @owner.setter
+    def owner(self, new_owner: str):
+        if self._parent is not None:
+            self._parent.check_writable()
+        versions.record(("attr", self, "owner", self._owner, new_owner))
+        self._owner = new_owner
+        self.invalidate_hash()
+
+    @property
+    def children(self) -> dict[object]:
+        # a virtual directory produces its children on first access
+        if self._virtual is not None:
+            self._virtual.materialize(self)
+        return self._children
+
     @parent.setter
     def parent(self, new_parent: object):
         """Specify a new parent for the file node.
@@ -37,11 +166,139 @@ class FileNode:
         """
         if self._parent is not None:
             # the original parent doesn't claim the child anymore if the node has an original parent
-            self._parent.children.pop(self.name)
+            self._parent._detach_child(self)
+            self._parent = None
         if new_parent is not None:
             # establish the new parent-child relationship with the new parent
+            # (the parent is only set once the new parent has accepted the child)
+            new_parent._attach_child(self)
             self._parent = new_parent
-            self._parent.children[self.name] = self
+
+    def rename(self, new_name: str):
+        # only a detached node can be renamed, since its parent indexes it by name
+        versions.record(("attr", self, "name", self.name, new_name))
+        self.name = new_name
+
+    def check_writable(self):
+        # a read-only virtual directory refuses any change to its children
+        if self._virtual is not None:
+            self._virtual.check_writable()
+
+    def _attach_child(self, child: object):
+        self.check_writable()
+        versions.record(("attach", self, child))
+        self._mark_stale(child)
+        self.invalidate_hash()
+        self._children[child.name] = child
+        # keep the sorted index in sync if it has been built
+        if self._sorted_names is not None:
+            self._sorted_names.add(child.name)
+
+    def _detach_child(self, child: object):
+        self.check_writable()
+        versions.record(("detach", self, child))
+        # take the child out of the hash of this directory
+        if self._digest_sum is not None and child._contribution is not None:
+            self._digest_sum -= child._contribution
+        child._contribution = None
+        if self._stale_children is not None:
+            self._stale_children.discard(child)
+        self.invalidate_hash()
+        self._children.pop(child.name)
+        if self._sorted_names is not None:
+            self._sorted_names.remove(child.name)
+
+    def _mark_stale(self, child: object):
+        # the child has to be added in again the next time this directory is hashed (a
+        # directory that has never been hashed adds up all of its children anyway)
+        if self._digest_sum is not None:
+            if self._stale_children is None:
+                self._stale_children = set()
+            self._stale_children.add(child)
+
+    def invalidate_hash(self):
+        # every invalid node is among the stale children of its parent, or its parent has never
+        # been hashed, so the walk up stops at the first node that was already invalid and
+        # already known to its parent
+        current_node = self
+        while current_node._parent is not None:
+            parent = current_node._parent
+            if current_node._hash is None and (parent._digest_sum is None or (
+                    parent._stale_children is not None and current_node in parent._stale_children)):
+                return
+            current_node._hash = None
+            parent._mark_stale(current_node)
+            current_node = parent
+        current_node._hash = None
+
+    @property
+    def content_hash(self) -> bytes:
+        """Get the Merkle hash of the subtree: the mode, owner and link target of the node, and
+        the names and hashes of its children. The name of the node itself is left to its parent,
+        so a subtree keeps its hash when it is moved or renamed.
+
+        The children are combined by adding up a digest of each (name, hash) pair, which does
+        not depend on their order, so a directory is hashed again by taking out and adding in
+        only the children that changed since its last hash, however many others it has.
+
+        Returns:
+            bytes: A 16-byte digest
+        """
+        if self._hash is not None:
+            return self._hash
+        # hash the invalid nodes bottom up, with an explicit stack for deep trees
+        stack = [self]
+        while len(stack) > 0:
+            node: FileNode = stack[-1]
+            if node._hash is not None:
+                stack.pop()
+                continue
+            if node._digest_sum is None:
+                # the first hash adds up every child
+                unhashed = [child for child in node._children.values() if child._hash is None]
+                if len(unhashed) > 0:
+                    stack.extend(unhashed)
+                    continue
+                node._digest_sum = 0
+                for child in node._children.values():
+                    child._contribution = child_digest(child)
+                    node._digest_sum += child._contribution
+                node._stale_children = None
+            elif node._stale_children is not None:
+                unhashed = [child for child in node._stale_children if child._hash is None]
+                if len(unhashed) > 0:
+                    stack.extend(unhashed)
+                    continue
+                for child in node._stale_children:
+                    if child._contribution is not None:
+                        node._digest_sum -= child._contribution
+                    child._contribution = child_digest(child)
+                    node._digest_sum += child._contribution
+                node._stale_children = None
+            # children taken out since the last hash can leave the sum below zero
+            node._digest_sum &= DIGEST_MASK
+            digest = blake2b(digest_size=16)
+            link = "-" if node.link_target is None else "l" + node.link_target
+            digest.update(f"{node.mode}\0{node.owner}\0{link}\0".encode())
+            digest.update(node._digest_sum.to_bytes(16, "big"))
+            node._hash = digest.digest()
+            stack.pop()
+        return self._hash
+
+    def names_with_prefix(self, prefix: str) -> list[str]:
+        """Get the names of all children that start with a prefix, in sorted order.
+
+        Args:
+            prefix (str): The prefix to match; an empty prefix matches every child.
+
+        Returns:
+            list[str]: The matching children names.
+        """
+        if self._sorted_names is None:
+            self._sorted_names = SortedNames(self.children)
+        # every name with the prefix sorts between the prefix itself and the prefix followed by
+        # the largest code point
+        return self._sorted_names.between(prefix, prefix + "\U0010ffff")
 
     @property
     def ancestors(self) -> list[object]:
@@ -58,8 +315,11 @@ class FileNode:
         """Get the type of the file node.
 
         Returns:
-            str: "directory" if the file is a directory; "file" if the file is a non-directory.
+            str: "directory" if the file is a directory; "link" if the file is a symbolic link;
+                 "file" if the file is any other non-directory.
         """
+        if self.link_target is not None:
+            return "link"
         # check the first bit of file mode
         is_dir = self.mode >> 6
         if is_dir:
@@ -67,6 +327,17 @@ class FileNode:
         else:
             return "file"
 
+    @property
+    def mode_string(self) -> str:
+        """Get the human-readable form of the file mode (e.g. "drwxr-x").
+
+        Returns:
+            str: The mode string looked up from the precomputed table.
+        """
+        if self.link_target is not None:
+            return "l" + MODE_STRINGS[self.mode][1:]
+        return MODE_STRINGS[self.mode]
+
     @property
     def is_root(self) -> bool:
         """See if the node is a root node, for treating the root node specifically
@@ -91,6 +362,92 @@ class FileNode:
         offset = rwx_offsets[column] + uo_offsets[identity]
         return (self.mode & 1 << offset) != 0
 
+    def follow(self, system_states: dict, hops: int = 0, trail: list = None) -> object:
+        """Get the node that a symbolic link eventually points to.
+
+        Args:
+            hops (int): The number of links already followed by the current lookup
+            trail (list): If given, the lookups that the result depends on are added to it
+                          (see walk_levels)
+
+        Returns:
+            FileNode: The node itself if it is not a link; None if the link is dangling.
+        """
+        if self.link_target is None:
+            return self
+        # the cached target stays valid as long as every lookup on the way gives the same node,
+        # so only changes along the target chain make it resolve again
+        cache = self._link_cache
+        if cache is None or not lookups_hold(cache[0]):
+            if hops >= MAX_LINK_HOPS:
+                raise predefined_errors.TooManyLinks
+            lookups = []
+            # relative targets start from the directory holding the link
+            if self.link_target.startswith("/"):
+                start = system_states["root"]
+            else:
+                start = self._parent
+                lookups.append((self, None, start))
+            resolved = walk_levels(system_states, start, self.link_target.split("/"), hops + 1, lookups)
+            # how many links deep the resolution went, counting this one
+            chain = 1 + max((found._link_cache[2] for _, name, found in lookups
+                             if name is not None and found is not None and found.link_target is not None),
+                            default=0)
+            cache = self._link_cache = (lookups, resolved, chain)
+        elif hops + cache[2] > MAX_LINK_HOPS:
+            # a cached resolution still counts every link it went through
+            raise predefined_errors.TooManyLinks
+        if trail is not None:
+            trail.extend(cache[0])
+        return cache[1]
+
+
+def lookups_hold(lookups: list) -> bool:
+    # check that every lookup recorded by walk_levels would still find the same node
+    for directory, name, found in lookups:
+        if name is None:
+            if directory._parent is not found:
+                return False
+        elif directory._children.get(name) is not found:
+            return False
+    return True
+
+
+def walk_levels(system_states: dict, start: FileNode, levels: list[str], hops: int = 0,
+                trail: list = None) -> FileNode:
+    """Walk down the tree level by level, following symbolic links on the way.
+
+    Args:
+        start (FileNode): The directory to start from
+        levels (list[str]): The level names, which may include . and ..
+        hops (int): The number of links already followed by the current lookup
+        trail (list): If given, every lookup made is added to it as (directory, name, node
+                      found), or (node, None, parent) for a .., so the result can be checked
+                      again later without walking
+
+    Returns:
+        FileNode: The node that the levels lead to, or None if there is no such node.
+    """
+    current_node = start
+    for level in levels:
+        if level == "..":
+            if not current_node.is_root:
+                if trail is not None:
+                    trail.append((current_node, None, current_node.parent))
+                current_node = current_node.parent
+        elif level == "." or level == "":
+            pass
+        else:
+            child_node = current_node.children.get(level)
+            if trail is not None:
+                trail.append((current_node, level, child_node))
+            if child_node is None:
+                return None
+            current_node = child_node.follow(system_states, hops, trail)
+            if current_node is None:
+                return None
+    return current_node
+
 class FilePath:
     levels: list[str]
     file_name: str
@@ -149,14 +506,18 @@ class FilePath:
                 elif level == "." or level == "":
                     # remain at the same node if . or empty is found
                     pass
-                elif level in current_node.children:
-                    # jump to the child node if the level name is a child name of the current node
-                    current_node = current_node.children[level]
                 else:
-                    # ERROR: the current level name cannot be found
-                    # (i.e. what the path refers to doesn't exist)
-                    self.semantical_status = "error"
-                    break
+                    # jump to the child node if the level name is a child name of the current node
+                    # (or to what the child points to if it is a symbolic link)
+                    next_node = current_node.children.get(level)
+                    if next_node is not None:
+                        next_node = next_node.follow(system_states)
+                    if next_node is None:
+                        # ERROR: the current level name cannot be found
+                        # (i.e. what the path refers to doesn't exist)
+                        self.semantical_status = "error"
+                        break
+                    current_node = next_node
             if self.semantical_status == "pending":
                 # set semantical status to success if there is no error
                 self.semantical_status = "success"
@@ -191,24 +552,26 @@ class FilePath:
         path_obj.semantical_status = "success"
         return path_obj
 
-    def get_node(self, system_states: dict, require_parent_node=False) -> FileNode:
+    def get_node(self, system_states: dict, require_parent_node=False, follow_links=True) -> FileNode:
         """Get a file node by its path.
 
+        Args:
+            require_parent_node (bool): Get the directory holding the file instead.
+            follow_links (bool): If the file itself is a symbolic link, get what it points to
+                                 rather than the link. Links in the ancestors are always followed.
+
         Returns:
             FileNode: returns the node object of the target file. If the target file is not found, returns None instead. 
         """
-        current_node: FileNode = system_states["root"]
         if self.is_root:
             return system_states["root"]
-        for dir_name in self.levels:
-            if dir_name in current_node.children.keys():
-                current_node = current_node.children[dir_name]
-            else:
-                return None
-        if require_parent_node:
+        current_node = walk_levels(system_states, system_states["root"], self.levels)
+        if require_parent_node or current_node is None:
             return current_node
-        else:
-            return current_node.children.get(self.file_name)
+        target_node = current_node.children.get(self.file_name)
+        if target_node is not None and follow_links:
+            return target_node.follow(system_states)
+        return target_node
 
     def __str__(self):
         if self.is_root:
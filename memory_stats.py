@@ -0,0 +1,142 @@
+import random
+import sys
+from file_system import FileNode
+
+# attributes every file node carries; anything else on a node is a cache or an index
+BASE_NODE_ATTRIBUTES = {"name", "_mode", "_owner", "_parent", "_children", "link_target"}
+# entries of the system states that are not caches or indexes
+BASE_STATE_KEYS = {"users", "effective_user", "root", "pwd"}
+
+
+def slot_values(obj: object) -> list:
+    # the attributes of an object that keeps them in __slots__ rather than in __dict__
+    values = []
+    for cls in type(obj).__mro__:
+        slots = getattr(cls, "__slots__", ())
+        for name in [slots] if isinstance(slots, str) else slots:
+            if name != "__dict__" and hasattr(obj, name):
+                values.append(getattr(obj, name))
+    return values
+
+
+def deep_getsizeof(obj: object, seen: set, root: FileNode = None) -> int:
+    """Get the size of an object and everything it holds, without descending into file nodes.
+
+    Args:
+        obj (object): The object to measure
+        seen (set): ids of objects that are already counted, so shared objects are counted once
+        root (FileNode): If given, file nodes that are not in the tree under it (such as the
+                         ones the versions keep for undo) are counted with their subtrees
+
+    Returns:
+        int: The size in bytes
+    """
+    size = 0
+    # whether the nodes met so far are in the tree, so each path up is only walked once
+    in_tree = {id(root): True}
+    # an explicit stack, since chains such as the versions of the states can be long
+    stack = [obj]
+    while len(stack) > 0:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        if isinstance(obj, FileNode):
+            if root is None or _is_in_tree(obj, in_tree):
+                continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        else:
+            if hasattr(obj, "__dict__"):
+                stack.append(vars(obj))
+            stack.extend(slot_values(obj))
+    return size
+
+
+def _is_in_tree(node: FileNode, in_tree: dict) -> bool:
+    path = []
+    while id(node) not in in_tree and node is not None:
+        path.append(node)
+        node = node._parent
+    found = node is not None and in_tree[id(node)]
+    for visited in path:
+        in_tree[id(visited)] = found
+    return found
+
+
+def measure_footprint(system_states: dict, sample_stride: int = 1) -> dict:
+    """Report the live memory used by the file tree and the structures around it.
+
+    Every object is counted once, in the first category that reaches it, and the walks stop
+    at the system states themselves: the indexes are measured first, so the structures that
+    nodes share with the states (such as the mount of a virtual directory) count as indexes.
+
+    Args:
+        system_states (dict): The address of the set of system states
+        sample_stride (int): 1 to measure every node. Otherwise the walk still visits every
+                             node, to count them and their owners, but only measures one in
+                             about every sample_stride of them, at random gaps so that the
+                             sample does not follow the shape of the tree, and the per-node
+                             figures are scaled up by the node count.
+
+    Returns:
+        dict: "node_count", "sampled_count", and a (count, bytes) pair for each of
+              "nodes", "children", "names", "owners", "node_caches" and "indexes". The
+              indexes include the versions, and the removed nodes they keep for undo.
+    """
+    report = {category: [0, 0] for category in
+              ["nodes", "children", "names", "owners", "node_caches", "indexes"]}
+    seen = {id(system_states)}
+    # whatever else lives in the system states is a cache or an index
+    for key, value in system_states.items():
+        if key not in BASE_STATE_KEYS:
+            report["indexes"][0] += 1
+            report["indexes"][1] += deep_getsizeof(value, seen, system_states["root"])
+    seen_owners = set()
+    node_count = sampled_count = 0
+    # the gaps between measured nodes average the stride; the generator is seeded so that
+    # the same tree gets the same report
+    generator = random.Random(0)
+    next_sample = generator.randint(1, sample_stride)
+    # walk the tree with an explicit stack, as deep trees would exceed the recursion limit
+    stack = [system_states["root"]]
+    while len(stack) > 0:
+        node: FileNode = stack.pop()
+        # only what is in memory: virtual directories are not materialized by the walk
+        stack.extend(node._children.values())
+        node_count += 1
+        # owner names are shared between nodes, so every distinct string is counted once
+        if id(node.owner) not in seen_owners:
+            seen_owners.add(id(node.owner))
+            report["owners"][0] += 1
+            report["owners"][1] += sys.getsizeof(node.owner)
+        # measure nodes all over the tree, not just the ones met first
+        if node_count < next_sample:
+            continue
+        next_sample += 1 if sample_stride == 1 else generator.randint(1, 2 * sample_stride - 1)
+        sampled_count += 1
+        attributes = vars(node)
+        report["nodes"][1] += sys.getsizeof(node) + sys.getsizeof(attributes)
+        report["children"][1] += sys.getsizeof(node._children)
+        report["names"][1] += sys.getsizeof(node.name)
+        for attribute, value in attributes.items():
+            # caches that are not set take no memory of their own
+            if attribute not in BASE_NODE_ATTRIBUTES and value is not None:
+                report["node_caches"][0] += 1
+                report["node_caches"][1] += deep_getsizeof(value, seen)
+    if sampled_count == 0:
+        # too few nodes to have met a sample: measure them all
+        return measure_footprint(system_states)
+    # scale the sampled per-node figures up to the whole tree
+    for category in ["nodes", "children", "names", "node_caches"]:
+        report[category][1] = report[category][1] * node_count // sampled_count
+    report["node_caches"][0] = report["node_caches"][0] * node_count // sampled_count
+    report["nodes"][0] = report["children"][0] = report["names"][0] = node_count
+    report = {category: tuple(pair) for category, pair in report.items()}
+    report["node_count"] = node_count
+    report["sampled_count"] = sampled_count
+    return report
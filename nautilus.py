@@ -1,6 +1,13 @@
 
 
+import argparse
+import accounting
 import builtin_commands
+import completion
+import session_trace
+import versions
+import virtual
+import watch
 from predefined_errors import InvalidSyntax, NautilusException
 
 def init():
@@ -8,28 +15,47 @@ def init():
     system_states = {
         "users": {"root"},
         "effective_user": "root",
-        "root": builtin_commands.FileNode(name=None, mode=0b1111101, owner="root", parent=None)
+        "root": builtin_commands.FileNode(name=None, mode=0b1111101, owner="root", parent=None),
+        "watches": {}
     }
     # set the current directory to root
     system_states["pwd"] = system_states["root"]
+    # the root directory is the first thing root owns
+    system_states["usage"] = {}
+    system_states["quotas"] = {}
+    accounting.charge(system_states, system_states["root"])
+    # the changes made by every command from here on can be undone
+    system_states["versions"] = versions.VersionTree()
     return system_states
 
-def prompt(system_states):
-    print(f"{system_states['effective_user']}:\
-{builtin_commands.FilePath.from_node(system_states, system_states['pwd'])}$ ", end='')
+def prompt_text(system_states) -> str:
+    return f"{system_states['effective_user']}:\
+{builtin_commands.FilePath.from_node(system_states, system_states['pwd'])}$ "
 
-def run(user_input: str, system_states: dict):
+def run(user_input: str, system_states: dict) -> str:
+    """Run a line of user input.
+
+    Returns:
+        str: The outcome: "ok", "error", "not_found" for an unknown command, or None for no input.
+    """
+    # go through the session recorder if one is attached
+    recorder = system_states.get("recorder")
+    if recorder is not None:
+        return recorder.record(user_input, system_states, execute)
+    return execute(user_input, system_states)
+
+def execute(user_input: str, system_states: dict) -> str:
     ### Step 1: Simple parse & safety check
     # do nothing if the user gives zero input
     if len(user_input) == 0:
-        return
+        return None
     # divide user input into command name and its argument string
     cmd, argstr = (user_input + " ").split(" ", 1)
     router = builtin_commands.router.get(cmd)
     # check if the specified command exists in the router
     if cmd not in builtin_commands.router:
         print(cmd + ": Command not found")
-        return
+        return "not_found"
     # get the router
     router_method, router_params = router["method"], router["parameters"]
     try:
@@ -153,19 +179,43 @@ def run(user_input: str, system_states: dict):
         if len(required_params_checklist) > 0:
             # ERROR: too few arguments
             raise InvalidSyntax
-        ### Step 4: Execute the command
-        router_method(args, system_states)
+        ### Step 4: Execute the command (whatever it changes, even if it fails halfway, becomes a new version)
+        with versions.recording(system_states.get("versions")):
+            router_method(args, system_states)
+        outcome = "ok"
     except NautilusException as err:
         print(cmd + ": " + err.message)
+        outcome = "error"
+    # deliver the changes made by the command to batched watchers
+    watch.flush(system_states)
+    return outcome
 
 def main():
+    parser = argparse.ArgumentParser(description="Simple Nautilus")
+    parser.add_argument("--record", metavar="TRACE",
+                        help="record the session into a trace file (gzipped if it ends with .gz)")
+    parser.add_argument("--proc", action="store_true",
+                        help="mount a read-only /proc with live session information")
+    parser.add_argument("--proc-capacity", type=int, default=1024, metavar="N",
+                        help="how many /proc directories may stay materialized (default 1024)")
+    options = parser.parse_args()
     system_states = init()
-    # Nautilus starts working
-    while True:
-        # display prompt message and ask for user input
-        prompt(system_states)
-        user_input = input().strip()
-        run(user_input, system_states)
+    if options.proc:
+        virtual.mount_proc(system_states, options.proc_capacity)
+    if options.record is not None:
+        system_states["recorder"] = session_trace.TraceRecorder(options.record)
+    # complete command names and paths on tab if readline is available
+    completion.install(system_states)
+    try:
+        # Nautilus starts working
+        while True:
+            # display prompt message and ask for user input
+            # (the prompt goes through input() so readline can redraw it while completing)
+            user_input = input(prompt_text(system_states)).strip()
+            run(user_input, system_states)
+    finally:
+        if options.record is not None:
+            system_states["recorder"].close()
 
 if __name__ == '__main__':
     main()
@@ -25,4 +25,14 @@ class PermissionDenied(NautilusException):
     def __init__(self):
         super().__init__("Permission denied")
 
+class QuotaExceeded(NautilusException):
+    def __init__(self):
+        super().__init__("Disk quota exceeded")
+
+class TooManyLinks(NautilusException):
+    def __init__(self):
+        super().__init__("Too many levels of symbolic links")
 
+class ReadOnlyFileSystem(NautilusException):
+    def __init__(self):
+        super().__init__("Read-only file system")
@@ -0,0 +1,173 @@
+'''
+Replay recorded sessions (see nautilus.py --record) against the current build.
+
+Usage: python replay.py TRACE [TRACE ...] [-j PROCESSES] [--paced] [--state STATE]
+'''
+import argparse
+import io
+import pickle
+import time
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+import accounting
+import nautilus
+from file_system import FileNode, FilePath
+from session_trace import load_trace
+
+
+def save_state(system_states: dict, path: str):
+    """Store system states for replays to start from.
+
+    The tree is stored as flat records from an explicit walk, so deep trees do not hit the
+    recursion limit of pickle. Only the tree, the users, the effective user, the working
+    directory and the quotas are kept: the recorder, watches, publishers and versions belong
+    to the session, the usage counters are rebuilt on loading, and virtual directories
+    (whose providers cannot be stored) are left out with everything under them.
+    """
+    # (parent index, name, mode, owner, link target), parents before their children
+    records = []
+    stack = [(system_states["root"], -1)]
+    while len(stack) > 0:
+        node, parent_index = stack.pop()
+        if node._virtual is not None:
+            continue
+        records.append((parent_index, node.name, node.mode, node.owner, node.link_target))
+        index = len(records) - 1
+        stack.extend((child, index) for child in node._children.values())
+    states = {
+        "records": records,
+        "users": set(system_states["users"]),
+        "effective_user": system_states["effective_user"],
+        "pwd": str(FilePath.from_node(system_states, system_states["pwd"])),
+        "quotas": {user: dict(limits) for user, limits in system_states.get("quotas", {}).items()}
+    }
+    with open(path, "wb") as file:
+        pickle.dump(states, file)
+
+
+def load_state(path: str) -> dict:
+    with open(path, "rb") as file:
+        states = pickle.load(file)
+    system_states = nautilus.init()
+    root: FileNode = system_states["root"]
+    _, _, root.mode, root.owner, _ = states["records"][0]
+    nodes = [root]
+    for parent_index, name, mode, owner, link_target in states["records"][1:]:
+        nodes.append(FileNode(name, mode, owner, nodes[parent_index], link_target=link_target))
+    system_states["users"] = states["users"]
+    system_states["effective_user"] = states["effective_user"]
+    system_states["quotas"] = states["quotas"]
+    # the working directory may have been under a virtual directory that was left out
+    system_states["pwd"] = FilePath(system_states, states["pwd"]).get_node(system_states) or root
+    # the usage counters are rebuilt from the tree itself, which is also right for states
+    # built without the commands
+    accounting.recount(system_states)
+    return system_states
+
+
+def replay_trace(trace_path: str, paced: bool = False, state_path: str = None) -> dict:
+    """Run every command of a trace against fresh system states.
+
+    Args:
+        trace_path (str): The trace to replay
+        paced (bool): True to keep the original time between commands; False to go as fast as possible
+        state_path (str): Start from saved system states instead of init()
+
+    Returns:
+        dict: "trace", "commands", "elapsed", "latencies" (seconds), and "mismatches",
+              a list of (command index, command line, what differs)
+    """
+    entries = load_trace(trace_path)
+    system_states = load_state(state_path) if state_path is not None else nautilus.init()
+    latencies = []
+    mismatches = []
+    start = time.perf_counter()
+    for i, entry in enumerate(entries):
+        if paced:
+            delay = (entry["t"] - entries[0]["t"]) - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        # the session should be in the same place as when it was recorded
+        pwd = str(FilePath.from_node(system_states, system_states["pwd"]))
+        if system_states["effective_user"] != entry["u"] or pwd != entry["d"]:
+            mismatches.append((i, entry["c"], f"session is {system_states['effective_user']}:{pwd}, "
+                                              f"recorded {entry['u']}:{entry['d']}"))
+        output = io.StringIO()
+        command_start = time.perf_counter()
+        try:
+            with redirect_stdout(output):
+                outcome = nautilus.execute(entry["c"], system_states)
+        except SystemExit:
+            outcome = "exit"
+        latencies.append(time.perf_counter() - command_start)
+        if outcome != entry["o"]:
+            mismatches.append((i, entry["c"], f"outcome {outcome}, recorded {entry['o']}"))
+        elif output.getvalue() != entry["p"]:
+            mismatches.append((i, entry["c"], f"output {output.getvalue()!r}, recorded {entry['p']!r}"))
+        if outcome == "exit":
+            break
+    return {
+        "trace": trace_path,
+        "commands": len(latencies),
+        "elapsed": time.perf_counter() - start,
+        "latencies": latencies,
+        "mismatches": mismatches
+    }
+
+
+def _replay_trace(job: tuple) -> dict:
+    return replay_trace(*job)
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if len(sorted_values) == 0:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def replay(trace_paths: list, processes: int = 1, paced: bool = False, state_path: str = None) -> dict:
+    """Replay several traces concurrently, one process per trace at a time.
+
+    Returns:
+        dict: "commands", "elapsed", "throughput" (commands per second), "p50", "p90", "p99"
+              (latencies in seconds) and "results", the replay_trace() result of each trace
+    """
+    start = time.perf_counter()
+    with Pool(processes) as pool:
+        results = pool.map(_replay_trace, [(path, paced, state_path) for path in trace_paths], 1)
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for result in results for latency in result["latencies"])
+    return {
+        "commands": len(latencies),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p90": percentile(latencies, 0.9),
+        "p99": percentile(latencies, 0.99),
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Simple Nautilus sessions")
+    parser.add_argument("traces", nargs="+", metavar="TRACE")
+    parser.add_argument("-j", "--processes", type=int, default=1)
+    parser.add_argument("--paced", action="store_true", help="keep the recorded time between commands")
+    parser.add_argument("--state", help="start from system states saved with replay.save_state")
+    options = parser.parse_args()
+    report = replay(options.traces, options.processes, options.paced, options.state)
+    print(f"{report['commands']} commands in {report['elapsed']:.3f}s "
+          f"({report['throughput']:,.0f} commands/s)")
+    print(f"latency p50 {report['p50'] * 1e6:.0f}us, p90 {report['p90'] * 1e6:.0f}us, "
+          f"p99 {report['p99'] * 1e6:.0f}us")
+    mismatch_count = 0
+    for result in report["results"]:
+        for index, command, difference in result["mismatches"]:
+            mismatch_count += 1
+            print(f"{result['trace']}:{index + 1}: {command}: {difference}")
+    if mismatch_count > 0:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import gzip
+import io
+import json
+import sys
+import time
+from contextlib import redirect_stdout
+from file_system import FilePath
+
+# Each command is a line of JSON with short keys:
+#   t - wall clock time when the command started
+#   u - effective user, d - working directory, c - the command line
+#   o - outcome (see nautilus.run, plus "exit"), l - latency in microseconds
+#   p - what the command printed
+
+
+def open_trace(path: str, mode: str):
+    # traces ending with .gz are compressed
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class Tee(io.TextIOBase):
+    def __init__(self, *streams):
+        # write to several text streams at once
+        self.streams = streams
+
+    def write(self, text: str) -> int:
+        for stream in self.streams:
+            stream.write(text)
+        return len(text)
+
+    def flush(self):
+        for stream in self.streams:
+            stream.flush()
+
+
+class TraceRecorder:
+    def __init__(self, path: str):
+        """Return a recorder writing a new trace file.
+
+        Args:
+            path (str): Where to write the trace
+        """
+        self.file = open_trace(path, "w")
+
+    def record(self, user_input: str, system_states: dict, execute) -> str:
+        """Run a command with `execute` and log it to the trace.
+
+        Returns:
+            str: The outcome of the command
+        """
+        if len(user_input) == 0:
+            return execute(user_input, system_states)
+        entry = {
+            "t": time.time(),
+            "u": system_states["effective_user"],
+            "d": str(FilePath.from_node(system_states, system_states["pwd"])),
+            "c": user_input
+        }
+        output = io.StringIO()
+        start = time.perf_counter()
+        try:
+            # the output still reaches the user, and a copy goes to the trace
+            with redirect_stdout(Tee(sys.stdout, output)):
+                entry["o"] = execute(user_input, system_states)
+        except SystemExit:
+            entry["o"] = "exit"
+            raise
+        finally:
+            entry["l"] = round((time.perf_counter() - start) * 1e6)
+            entry["p"] = output.getvalue()
+            self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self.file.flush()
+        return entry["o"]
+
+    def close(self):
+        self.file.close()
+
+
+def load_trace(path: str) -> list[dict]:
+    entries = []
+    with open_trace(path, "r") as file:
+        try:
+            for line in file:
+                if len(line.strip()) > 0:
+                    entries.append(json.loads(line))
+        except EOFError:
+            # a compressed trace of a session that crashed has no end marker, but every
+            # command was flushed as it was recorded
+            pass
+    return entries
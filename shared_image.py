@@ -0,0 +1,433 @@
+'''
+A read-only image of the file tree in a multiprocessing.shared_memory segment, so that a
+pool of worker processes can answer read-only commands without a copy of the tree each.
+
+Layout of the segment:
+    header      magic, version, node count, offset of the string table
+    node table  one fixed-size record per node, in breadth-first order, with the children
+                of every directory stored contiguously and sorted by name
+    strings     UTF-8 names, owners (each owner is stored once) and symbolic link targets
+'''
+import struct
+import time
+from multiprocessing import Pool, resource_tracker, shared_memory
+import predefined_errors
+import watch
+from file_system import MAX_LINK_HOPS, MODE_STRINGS, FileNode
+
+HEADER_FORMAT = "<4sIIQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MAGIC = b"NTLS"
+VERSION = 2
+# name offset, name length, owner offset, owner length, parent, first child, child count,
+# link target offset, link target length (NO_TARGET for other files), mode
+NODE_FORMAT = "<IIIIIIIIIB3x"
+NO_TARGET = 0xFFFFFFFF
+NODE_SIZE = struct.calcsize(NODE_FORMAT)
+
+
+def build_image(system_states: dict) -> bytearray:
+    """Flatten the file tree into the image layout.
+
+    Returns:
+        bytearray: The whole image
+    """
+    order: list[FileNode] = [system_states["root"]]
+    parents: list[int] = [0]
+    first_children: list[int] = []
+    strings = bytearray()
+    string_offsets: dict = {}
+    def add_string(text: str) -> tuple:
+        # owners repeat a lot, so equal strings share the same bytes
+        if text not in string_offsets:
+            encoded = text.encode()
+            string_offsets[text] = (len(strings), len(encoded))
+            strings.extend(encoded)
+        return string_offsets[text]
+    # breadth-first numbering puts the children of each node next to each other
+    i = 0
+    while i < len(order):
+        first_children.append(len(order))
+        for _, child in sorted(order[i].children.items()):
+            order.append(child)
+            parents.append(i)
+        i += 1
+    image = bytearray(HEADER_SIZE + NODE_SIZE * len(order))
+    struct.pack_into(HEADER_FORMAT, image, 0, MAGIC, VERSION, len(order), len(image))
+    for i, node in enumerate(order):
+        # names are not shared, so they are appended without the lookup
+        name = b"" if node.is_root else node.name.encode()
+        name_offset = len(strings)
+        strings.extend(name)
+        owner_offset, owner_length = add_string(node.owner)
+        target_offset, target_length = 0, NO_TARGET
+        if node.link_target is not None:
+            target = node.link_target.encode()
+            target_offset, target_length = len(strings), len(target)
+            strings.extend(target)
+        struct.pack_into(NODE_FORMAT, image, HEADER_SIZE + NODE_SIZE * i,
+                         name_offset, len(name), owner_offset, owner_length, parents[i],
+                         first_children[i], len(node.children), target_offset, target_length,
+                         node.mode)
+    return image + strings
+
+
+def publish(system_states: dict, name: str = None) -> shared_memory.SharedMemory:
+    """Copy the current tree into a new shared memory segment.
+
+    Returns:
+        SharedMemory: The segment; the caller should close() and unlink() it when done.
+    """
+    image = build_image(system_states)
+    segment = shared_memory.SharedMemory(name=name, create=True, size=len(image))
+    segment.buf[:len(image)] = image
+    return segment
+
+
+class TreeImage:
+    def __init__(self, name: str, track: bool = False):
+        """Attach to a published image.
+
+        Args:
+            name (str): The name of the shared memory segment
+            track (bool): True if the publisher is an ancestor of this process (so both share
+                          a resource tracker); False in unrelated processes, which would
+                          otherwise unlink the segment when they exit.
+        """
+        self.segment = shared_memory.SharedMemory(name=name)
+        if not track:
+            resource_tracker.unregister(self.segment._name, "shared_memory")
+        self.segment_name = name
+        self.buf = self.segment.buf
+        magic, version, self.node_count, self.strings_offset = \
+            struct.unpack_from(HEADER_FORMAT, self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{name} is not a tree image")
+
+    def close(self):
+        self.buf = None
+        self.segment.close()
+
+    def node(self, index: int) -> tuple:
+        """Get the raw record of a node.
+
+        Returns:
+            tuple: (name offset, name length, owner offset, owner length, parent,
+                    first child, child count, link target offset, link target length, mode)
+        """
+        return struct.unpack_from(NODE_FORMAT, self.buf, HEADER_SIZE + NODE_SIZE * index)
+
+    def _string(self, offset: int, length: int) -> bytes:
+        start = self.strings_offset + offset
+        return bytes(self.buf[start:start + length])
+
+    def name(self, index: int) -> str:
+        record = self.node(index)
+        return self._string(record[0], record[1]).decode()
+
+    def owner(self, index: int) -> str:
+        record = self.node(index)
+        return self._string(record[2], record[3]).decode()
+
+    def mode(self, index: int) -> int:
+        return self.node(index)[9]
+
+    def link_target(self, index: int) -> str:
+        # None if the node is not a symbolic link
+        record = self.node(index)
+        if record[8] == NO_TARGET:
+            return None
+        return self._string(record[7], record[8]).decode()
+
+    def mode_string(self, index: int) -> str:
+        if self.link_target(index) is not None:
+            return "l" + MODE_STRINGS[self.mode(index)][1:]
+        return MODE_STRINGS[self.mode(index)]
+
+    def parent(self, index: int) -> int:
+        return self.node(index)[4]
+
+    def children(self, index: int) -> range:
+        record = self.node(index)
+        return range(record[5], record[5] + record[6])
+
+    def child(self, index: int, name: str) -> int:
+        """Find a child by name with a binary search over the sorted children range.
+
+        Returns:
+            int: The index of the child, or None if there is no such child.
+        """
+        target = name.encode()
+        low, high = self.children(index).start, self.children(index).stop
+        while low < high:
+            middle = (low + high) // 2
+            record = self.node(middle)
+            middle_name = self._string(record[0], record[1])
+            if middle_name < target:
+                low = middle + 1
+            elif middle_name > target:
+                high = middle
+            else:
+                return middle
+        return None
+
+    def follow(self, index: int, hops: int = 0) -> int:
+        """Get the node that a symbolic link eventually points to, like FileNode.follow.
+
+        Returns:
+            int: The index itself if it is not a link; None if the link is dangling.
+        """
+        target = self.link_target(index)
+        if target is None:
+            return index
+        if hops >= MAX_LINK_HOPS:
+            raise predefined_errors.TooManyLinks
+        start = 0 if target.startswith("/") else self.parent(index)
+        return self.walk(start, target.split("/"), hops + 1)
+
+    def walk(self, start: int, levels: list[str], hops: int = 0) -> int:
+        # same as file_system.walk_levels, on image nodes
+        current = start
+        for level in levels:
+            if level == "..":
+                current = self.parent(current)
+            elif level != "." and level != "":
+                current = self.child(current, level)
+                if current is None:
+                    return None
+                current = self.follow(current, hops)
+                if current is None:
+                    return None
+        return current
+
+    def resolve(self, path: str, pwd: str = "/", follow_links: bool = True) -> int:
+        """Get a node by its path, in the same way as the list-based FilePath resolution.
+
+        Returns:
+            int: The index of the node, or None if it does not exist.
+        """
+        if not path.startswith("/"):
+            path = pwd + "/" + path
+        levels = []
+        for level in path.split("/"):
+            if level == "..":
+                if len(levels) > 0:
+                    levels.pop()
+            elif level != "." and level != "":
+                levels.append(level)
+        if len(levels) == 0:
+            return 0
+        parent = self.walk(0, levels[:-1])
+        if parent is None:
+            return None
+        current = self.child(parent, levels[-1])
+        if current is not None and follow_links:
+            return self.follow(current)
+        return current
+
+    def ancestors(self, index: int) -> list[int]:
+        ancestors = []
+        while index != 0:
+            index = self.parent(index)
+            ancestors.append(index)
+        return ancestors
+
+    def path(self, index: int) -> str:
+        levels = [self.name(index)] if index != 0 else []
+        levels += [self.name(ancestor) for ancestor in self.ancestors(index)[:-1]]
+        return "/" + "/".join(reversed(levels))
+
+
+def is_image_node_doable(image: TreeImage, perm_bit: str, index: int, user: str) -> bool:
+    # same rules as utilities.is_file_doable, on an image node
+    if user == "root":
+        return True
+    offset = {"r": 2, "w": 1, "x": 0}[perm_bit] + (3 if image.owner(index) == user else 0)
+    return image.mode(index) & 1 << offset != 0
+
+
+def is_image_ancestors_doable(image: TreeImage, perm_bit: str, index: int, user: str) -> bool:
+    if user == "root":
+        return True
+    return all(is_image_node_doable(image, perm_bit, ancestor, user)
+               for ancestor in image.ancestors(index))
+
+
+def run_query(image: TreeImage, user: str, pwd: str, line: str) -> str:
+    """Answer a read-only command from an image.
+
+    Supported commands are `ls [-a] [-d] [-l] [PATH]` and `cd PATH`, with the same checks and
+    messages as the builtin ones; `cd` answers with the new working directory.
+
+    Returns:
+        str: What the command would print
+    """
+    # no input, no output, as in nautilus.run
+    if len(line.split()) == 0:
+        return ""
+    cmd = line.split()[0]
+    try:
+        return answer_query(image, user, pwd, line)
+    except predefined_errors.NautilusException as err:
+        return cmd + ": " + err.message + "\n"
+
+
+def answer_query(image: TreeImage, user: str, pwd: str, line: str) -> str:
+    cmd, *words = line.split()
+    flags = {word for word in words if word.startswith("-")}
+    paths = [word for word in words if not word.startswith("-")]
+    if cmd == "cd":
+        if len(paths) != 1 or len(flags) > 0:
+            return "cd: Invalid syntax\n"
+        # like the tree traversal of FilePath, .. after a symbolic link goes to the parent
+        # of what the link points to
+        path = paths[0] if paths[0].startswith("/") else pwd + "/" + paths[0]
+        target = image.walk(0, path.split("/"))
+        if target is None:
+            return "cd: No such file or directory\n"
+        if image.mode(target) >> 6 == 0:
+            return "cd: Destination is a file\n"
+        if not is_image_node_doable(image, "x", target, user):
+            return "cd: Permission denied\n"
+        return image.path(target) + "\n"
+    if cmd != "ls":
+        return cmd + ": Not a read-only command\n"
+    if len(paths) > 1 or not flags <= {"-a", "-d", "-l"}:
+        return "ls: Invalid syntax\n"
+    path = paths[0] if len(paths) > 0 else "."
+    target = image.resolve(path, pwd)
+    if target is None:
+        return "ls: No such file or directory\n"
+    parent = image.parent(target)
+    if not is_image_ancestors_doable(image, "x", target, user):
+        return "ls: Permission denied\n"
+    entries = {}
+    if image.mode(target) >> 6:
+        if not is_image_node_doable(image, "r", target, user):
+            return "ls: Permission denied\n"
+        if "-d" in flags:
+            if not is_image_node_doable(image, "r", parent, user):
+                return "ls: Permission denied\n"
+            if "-a" in flags or path[0] != ".":
+                entries[path] = target
+        else:
+            if "-a" in flags:
+                entries["."] = target
+                entries[".."] = parent
+            for child in image.children(target):
+                child_name = image.name(child)
+                if "-a" in flags or child_name[0] != ".":
+                    entries[child_name] = child
+    else:
+        if not is_image_node_doable(image, "r", parent, user):
+            return "ls: Permission denied\n"
+        if "-a" in flags or path[0] != ".":
+            entries[path] = target
+    if "-l" in flags:
+        lines = []
+        for name, index in sorted(entries.items()):
+            line = f"{image.mode_string(index)} {image.owner(index)} {name}"
+            if image.link_target(index) is not None:
+                line += " -> " + image.link_target(index)
+            lines.append(line)
+    else:
+        lines = sorted(entries)
+    return "".join(line + "\n" for line in lines)
+
+
+class ImagePublisher:
+    def __init__(self, system_states: dict, interval: float = 1.0):
+        """Keep an image of a tree published, republishing it after changes.
+
+        The image is republished by maybe_republish(), which QueryPool.query() calls before
+        answering each batch; callers that read images some other way have to call it
+        themselves.
+
+        Args:
+            system_states (dict): The address of the set of system states
+            interval (float): The minimum number of seconds between two publications
+        """
+        self.system_states = system_states
+        self.interval = interval
+        self.generation = 0
+        self.segment = None
+        self.published_at = None
+        self.changed = True
+        # any change in the tree makes the published image stale
+        self.subscription = watch.subscribe(system_states, system_states["root"], self._on_change)
+
+    def _on_change(self, event):
+        self.changed = True
+
+    @property
+    def name(self) -> str:
+        return self.segment.name
+
+    def publish(self):
+        old_segment = self.segment
+        self.segment = publish(self.system_states)
+        self.generation += 1
+        self.published_at = time.monotonic()
+        self.changed = False
+        # workers still reading the old image keep their mapping after the unlink
+        if old_segment is not None:
+            old_segment.close()
+            old_segment.unlink()
+
+    def maybe_republish(self) -> bool:
+        """Republish if the tree has changed and the interval has passed.
+
+        Returns:
+            bool: True if a new image was published
+        """
+        if self.changed and (self.published_at is None
+                             or time.monotonic() - self.published_at >= self.interval):
+            self.publish()
+            return True
+        return False
+
+    def close(self):
+        watch.unsubscribe(self.system_states, self.subscription)
+        if self.segment is not None:
+            self.segment.close()
+            self.segment.unlink()
+            self.segment = None
+
+
+# the image a worker process is attached to
+_worker_image: TreeImage = None
+
+
+def _worker_query(request: tuple) -> str:
+    global _worker_image
+    image_name, user, pwd, line = request
+    # follow the publisher to its latest image
+    if _worker_image is None or _worker_image.segment_name != image_name:
+        if _worker_image is not None:
+            _worker_image.close()
+        # pool workers share the resource tracker of the publisher
+        _worker_image = TreeImage(image_name, track=True)
+    return run_query(_worker_image, user, pwd, line)
+
+
+class QueryPool:
+    def __init__(self, publisher: ImagePublisher, workers: int):
+        """Return a pool of processes answering read-only commands from the published image."""
+        self.publisher = publisher
+        self.pool = Pool(workers)
+
+    def query(self, requests: list, chunksize: int = 64) -> list[str]:
+        """Answer (user, pwd, command line) requests in parallel.
+
+        Returns:
+            list[str]: The outputs, in the order of the requests
+        """
+        # answer from an image at most `interval` seconds behind the changes
+        self.publisher.maybe_republish()
+        name = self.publisher.name
+        return self.pool.map(_worker_query, [(name, user, pwd, line) for user, pwd, line in requests],
+                             chunksize)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
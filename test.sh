@@ -1,9 +1,11 @@
 #!/bin/bash
 
 coverage erase
-for testcase in pwd_trivial sweet_home weirdo perm
+for testcase in pwd_trivial sweet_home weirdo perm ls_formats watch quota symlinks mv_tree diff snapshots ls_recursive proc access_audit watch_permissions
 do
-  coverage run -a nautilus.py < e2e_tests/$testcase.in | diff e2e_tests/$testcase.out - > e2e_tests/$testcase\_actual.out
+  # command line options of a testcase (such as --proc) go in its .args file
+  options=$(cat e2e_tests/$testcase.args 2>/dev/null)
+  coverage run -a nautilus.py $options < e2e_tests/$testcase.in | diff e2e_tests/$testcase.out - > e2e_tests/$testcase\_actual.out
   char_count=$(cat e2e_tests/$testcase\_actual.out | wc -c)
   if [ $char_count -eq 0 ]
   then
@@ -13,4 +15,17 @@ do
     cat e2e_tests/$testcase\_actual.out
   fi
 done
+# checks of the Python APIs, which print what they found
+for check in shared_image replay virtual access_audit completion memstat
+do
+  coverage run -a e2e_tests/check_$check.py | diff e2e_tests/check_$check.out - > e2e_tests/check_$check\_actual.out
+  char_count=$(cat e2e_tests/check_$check\_actual.out | wc -c)
+  if [ $char_count -eq 0 ]
+  then
+    echo "Check $check passed!"
+  else
+    echo "Did not pass check $check"
+    cat e2e_tests/check_$check\_actual.out
+  fi
+done
 coverage report
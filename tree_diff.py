@@ -0,0 +1,129 @@
+from file_system import FileNode
+from versions import Version, VersionTree
+
+
+def diff_trees(old: FileNode, new: FileNode, can_descend=None):
+    """Find what differs between two subtrees, skipping every pair of subtrees with equal hashes.
+
+    Args:
+        old (FileNode): The root of the subtree before
+        new (FileNode): The root of the subtree after
+        can_descend: Called with a pair of directories; return False to leave them out.
+                     Every pair is compared by default.
+
+    Yields:
+        tuple: (path relative to the roots, change), where change is "added" or "removed" for
+               a node that exists on one side only (its subtree is not listed), or "mode",
+               "owner" or "target" for a node whose own attributes differ.
+    """
+    stack = [(".", old, new)]
+    while len(stack) > 0:
+        path, old_node, new_node = stack.pop()
+        if old_node is None:
+            yield (path, "added")
+            continue
+        if new_node is None:
+            yield (path, "removed")
+            continue
+        if old_node.content_hash == new_node.content_hash:
+            continue
+        if old_node.mode != new_node.mode:
+            yield (path, "mode")
+        if old_node.owner != new_node.owner:
+            yield (path, "owner")
+        if old_node.link_target != new_node.link_target:
+            yield (path, "target")
+        if can_descend is not None and not can_descend(old_node, new_node):
+            continue
+        old_children, new_children = old_node.children, new_node.children
+        # look every name up on the other side instead of sorting both sides, and only sort
+        # the names that differ
+        changed = []
+        shared_count = 0
+        find_new_child = new_children.get
+        for name, old_child in old_children.items():
+            new_child = find_new_child(name)
+            if new_child is not None:
+                shared_count += 1
+                if old_child.content_hash == new_child.content_hash:
+                    continue
+            changed.append(name)
+        # the new side only has names of its own if it has more than the shared ones
+        if shared_count < len(new_children):
+            changed.extend(name for name in new_children if name not in old_children)
+        # pushed in reverse order, so the paths come out sorted
+        for name in sorted(changed, reverse=True):
+            child_path = name if path == "." else path + "/" + name
+            stack.append((child_path, old_children.get(name), new_children.get(name)))
+
+
+def _states_at(operations: list) -> dict:
+    # what the operations leave of the parent, name, mode and owner of every node they touch
+    states = {}
+    for operation, forward in operations:
+        kind = operation[0]
+        if kind == "attach" or kind == "detach":
+            _, parent, child = operation
+            states.setdefault(child, {})["parent"] = parent if (kind == "attach") == forward else None
+        elif kind == "attr" and isinstance(operation[1], FileNode):
+            _, node, name, old, new = operation
+            states.setdefault(node, {})[name] = new if forward else old
+    return states
+
+
+def _describe(root: FileNode, node: FileNode, states: dict) -> tuple:
+    # (path, mode, owner, link target) of a node in a version, or None if it is not in the tree
+    names = []
+    current = node
+    while current is not root:
+        changes = states.get(current, {})
+        parent = changes.get("parent", current._parent)
+        if parent is None:
+            return None
+        names.append(changes.get("name", current.name))
+        current = parent
+    changes = states.get(node, {})
+    return ("/" + "/".join(reversed(names)), changes.get("mode", node.mode),
+            changes.get("owner", node.owner), node.link_target)
+
+
+def diff_versions(root: FileNode, tree: VersionTree, old: Version, new: Version) -> list:
+    """Find what differs between two versions of the tree, from the operations that lead from
+    one to the other, without going to either of them.
+
+    Nodes are told apart by identity rather than by path, so a node moved elsewhere is listed
+    as removed from its old path and added at its new one, and a file replaced by another at
+    the same path is listed as removed and added too.
+
+    Args:
+        root (FileNode): The root directory
+        tree (VersionTree): The versions of the system states
+        old (Version): The version before
+        new (Version): The version after
+
+    Returns:
+        list: (absolute path, change) tuples sorted by path, with the changes of diff_trees()
+    """
+    old_states = _states_at(tree.operations_between(tree.current, old))
+    new_states = _states_at(tree.operations_between(tree.current, new))
+    added, removed, changes = set(), set(), []
+    for node in old_states.keys() | new_states.keys():
+        before = _describe(root, node, old_states)
+        after = _describe(root, node, new_states)
+        if before is not None and (after is None or after[0] != before[0]):
+            removed.add(before[0])
+        if after is not None and (before is None or after[0] != before[0]):
+            added.add(after[0])
+        if before is None or after is None or after[0] != before[0]:
+            continue
+        for index, change in [(1, "mode"), (2, "owner"), (3, "target")]:
+            if before[index] != after[index]:
+                changes.append((before[0], change))
+    # like diff_trees, the subtree of an added or removed node is not listed
+    def outermost(paths: set) -> list:
+        return [path for path in paths if not any(
+            path[:index] in paths for index in range(1, len(path)) if path[index] == "/")]
+    changes.extend((path, "removed") for path in outermost(removed))
+    changes.extend((path, "added") for path in outermost(added))
+    order = {"removed": 0, "added": 1, "mode": 2, "owner": 3, "target": 4}
+    return sorted(changes, key=lambda change: (change[0].split("/"), order[change[1]]))
@@ -0,0 +1,304 @@
+'''
+Versions of the system states, for snapshots and undo/redo.
+
+Every command that changes something records its changes as reversible operations. The
+versions form a tree: each version keeps the operations that lead to it from its parent, so
+taking a snapshot is just naming the current version, and restoring one undoes the
+operations up to the common ancestor and redoes the ones down to the snapshot.
+
+The tree, the users, the usage counters and the quotas are versioned. The effective user, the
+working directory and the watches belong to the session: undo and redo leave them alone, and
+a snapshot only remembers the working directory to go back to.
+
+Operations:
+    ("attach", parent, child)          child was attached to parent
+    ("detach", parent, child)          child was detached from parent
+    ("attr", obj, name, old, new)      an attribute of obj was changed
+    ("item", dict, key, old, new)      an item of dict was changed (MISSING if absent)
+    ("add", set, item)                 item was added to set
+    ("discard", set, item)             item was removed from set
+'''
+from contextlib import contextmanager
+
+MISSING = object()
+# the version tree that changes are recorded into, while a command is running
+active = None
+
+
+def record(operation: tuple):
+    if active is not None:
+        active.pending.append(operation)
+
+
+@contextmanager
+def recording(tree: object):
+    """Record the changes made inside the block as a new version of the tree."""
+    global active
+    if tree is None:
+        yield
+        return
+    previous, active = active, tree
+    try:
+        yield
+    finally:
+        active = previous
+        tree.commit()
+
+
+@contextmanager
+def suspended():
+    """Make changes that are not part of any version (such as materializing virtual directories)."""
+    global active
+    previous, active = active, None
+    try:
+        yield
+    finally:
+        active = previous
+
+
+def set_item(mapping: dict, key: object, value: object):
+    record(("item", mapping, key, mapping.get(key, MISSING), value))
+    mapping[key] = value
+
+
+def pop_item(mapping: dict, key: object):
+    if key in mapping:
+        record(("item", mapping, key, mapping[key], MISSING))
+        mapping.pop(key)
+
+
+def add_to_set(items: set, item: object):
+    if item not in items:
+        record(("add", items, item))
+        items.add(item)
+
+
+def discard_from_set(items: set, item: object):
+    if item in items:
+        record(("discard", items, item))
+        items.discard(item)
+
+
+def _assign(obj: object, name: str, value: object):
+    if isinstance(obj, dict):
+        if value is MISSING:
+            obj.pop(name, None)
+        else:
+            obj[name] = value
+    else:
+        setattr(obj, name, value)
+
+
+def apply(operation: tuple, forward: bool):
+    # redo an operation if forward, or undo it otherwise
+    kind = operation[0]
+    if kind == "attach" or kind == "detach":
+        _, parent, child = operation
+        if (kind == "attach") == forward:
+            child.parent = parent
+        else:
+            child.parent = None
+    elif kind == "attr" or kind == "item":
+        _, obj, name, old, new = operation
+        _assign(obj, name, new if forward else old)
+    elif kind == "add" or kind == "discard":
+        _, items, item = operation
+        if (kind == "add") == forward:
+            items.add(item)
+        else:
+            items.discard(item)
+
+
+class Version:
+    # there is one version per command, so they are kept small
+    __slots__ = ["parent", "operations", "children", "last_child", "name_count", "depth"]
+
+    def __init__(self, parent: object, operations: list):
+        """Return a version of the system states.
+
+        Args:
+            parent (Version): The version this one was made from; None for the oldest one
+            operations (list): The operations that lead from the parent to this version
+        """
+        self.parent = parent
+        self.operations = operations
+        self.children = []
+        # the child that redo goes to
+        self.last_child = None
+        # how many snapshots name this version
+        self.name_count = 0
+        self.depth = 0 if parent is None else parent.depth + 1
+
+
+class VersionTree:
+    def __init__(self, history_limit: int = 100):
+        """Return the versions of a set of system states.
+
+        Args:
+            history_limit (int): How many commands can be undone, not counting the ones kept
+                                 by snapshots
+        """
+        self.history_limit = history_limit
+        self.root = self.current = Version(None, [])
+        self.snapshots: dict = {}
+        self.pending = []
+
+    def commit(self):
+        # make the changes recorded by a command a new version
+        if len(self.pending) == 0:
+            return
+        version = Version(self.current, self.pending)
+        self.pending = []
+        # a command made after undo abandons what could have been redone
+        abandoned = self.current.last_child
+        self.current.children.append(version)
+        self.current.last_child = version
+        self.current = version
+        if abandoned is not None:
+            self.release_branch(abandoned)
+        self.trim_history()
+
+    def _move(self, version: Version, forward: bool):
+        with suspended():
+            operations = version.operations if forward else reversed(version.operations)
+            for operation in operations:
+                apply(operation, forward)
+
+    def undo(self) -> bool:
+        if self.current.parent is None:
+            return False
+        self._move(self.current, False)
+        self.current.parent.last_child = self.current
+        self.current = self.current.parent
+        return True
+
+    def redo(self) -> bool:
+        if self.current.last_child is None:
+            return False
+        self._move(self.current.last_child, True)
+        self.current = self.current.last_child
+        return True
+
+    def snapshot(self, name: str, session: object = None):
+        """Name the current version.
+
+        Args:
+            name (str): The name of the snapshot; an older snapshot with that name is dropped
+            session (object): What restore() should hand back, for the parts of the states
+                              that undo and redo leave alone (such as the working directory)
+        """
+        self.drop(name)
+        self.snapshots[name] = (self.current, session)
+        self.current.name_count += 1
+
+    def drop(self, name: str):
+        version, _ = self.snapshots.pop(name, (None, None))
+        if version is None:
+            return
+        version.name_count -= 1
+        # only the versions from the dropped one up to the first one that is still needed go
+        redo_chain = self._redo_chain()
+        while version.parent is not None and len(version.children) == 0 \
+              and version.name_count == 0 and version not in redo_chain:
+            self._release(version)
+            version = version.parent
+
+    def restore(self, name: str) -> object:
+        """Go to a named version.
+
+        Returns:
+            object: The session given to snapshot()
+        """
+        target, session = self.snapshots[name]
+        # undo up to the common ancestor, then redo down to the snapshot
+        path_down = []
+        ancestor = target
+        ancestors = set()
+        while ancestor is not None:
+            ancestors.add(ancestor)
+            ancestor = ancestor.parent
+        while self.current not in ancestors:
+            self.undo()
+        ancestor = target
+        while ancestor is not self.current:
+            path_down.append(ancestor)
+            ancestor = ancestor.parent
+        # the branches that redo went to on the way down are abandoned, like after a commit
+        abandoned = []
+        for version in reversed(path_down):
+            if self.current.last_child is not None and self.current.last_child is not version:
+                abandoned.append(self.current.last_child)
+            self.current.last_child = version
+            self.redo()
+        for branch in abandoned:
+            self.release_branch(branch)
+        self.trim_history()
+        return session
+
+    def operations_between(self, start: Version, end: Version) -> list:
+        """Get what leads from one version to another, without going there.
+
+        Returns:
+            list: (operation, forward) pairs in the order they would be applied: the
+                  operations undone up to the common ancestor, then the ones redone down
+        """
+        ancestors = set()
+        version = end
+        while version is not None:
+            ancestors.add(version)
+            version = version.parent
+        operations = []
+        version = start
+        while version not in ancestors:
+            operations.extend((operation, False) for operation in reversed(version.operations))
+            version = version.parent
+        path_down = []
+        ancestor = end
+        while ancestor is not version:
+            path_down.append(ancestor)
+            ancestor = ancestor.parent
+        for ancestor in reversed(path_down):
+            operations.extend((operation, True) for operation in ancestor.operations)
+        return operations
+
+    def _redo_chain(self) -> set:
+        chain = set()
+        version = self.current
+        while version is not None:
+            chain.add(version)
+            version = version.last_child
+        return chain
+
+    def _release(self, version: Version):
+        parent = version.parent
+        parent.children.remove(version)
+        if parent.last_child is version:
+            parent.last_child = None
+
+    def release_branch(self, branch: Version):
+        """Release the versions of an abandoned branch that nothing can get back to any more
+        (neither redo nor a snapshot), along with the operations and the detached nodes that
+        only they refer to. The rest of the version tree is not visited.
+
+        Args:
+            branch (Version): A version that redo no longer goes to from its parent
+        """
+        # children come after their parent in a walk from the top, so going through the walk
+        # backwards releases the children before deciding on their parent
+        walk = []
+        stack = [branch]
+        while len(stack) > 0:
+            version = stack.pop()
+            walk.append(version)
+            stack.extend(version.children)
+        for version in reversed(walk):
+            if len(version.children) == 0 and version.name_count == 0:
+                self._release(version)
+
+    def trim_history(self):
+        # drop the oldest versions beyond the undo history, unless a snapshot keeps them
+        while self.current.depth - self.root.depth > self.history_limit \
+              and self.root.name_count == 0 and len(self.root.children) == 1:
+            self.root = self.root.children[0]
+            self.root.parent = None
+            self.root.operations = []
@@ -0,0 +1,246 @@
+'''
+Virtual directories, whose children are produced by a provider on first access instead of
+being built up front, and evicted again when they are neither used nor modified.
+'''
+from abc import ABC, abstractmethod
+from collections import OrderedDict, namedtuple
+import accounting
+import predefined_errors
+import versions
+import watch
+from file_system import FileNode, FilePath
+
+# a child as listed by a provider; provider is the ChildrenProvider of the child if the
+# child is a virtual directory itself
+VirtualEntry = namedtuple("VirtualEntry", ["name", "mode", "owner", "provider", "link_target"],
+                          defaults=[None, None])
+
+
+class ChildrenProvider(ABC):
+    # True to refuse creating and removing files in the directories of the provider
+    read_only = False
+
+    @abstractmethod
+    def list_children(self, node: FileNode) -> list[VirtualEntry]:
+        """List the children of a virtual directory.
+
+        Args:
+            node (FileNode): The directory to list
+        """
+
+    def version(self, node: FileNode) -> object:
+        """Tell whether the listing of a directory is still current.
+
+        Returns:
+            object: The listing is produced again whenever this value changes, unless
+                    users have changed something under the directory; None (the
+                    default) for listings that never change.
+        """
+        return None
+
+
+class VirtualDirectory:
+    def __init__(self, mount: object, provider: ChildrenProvider):
+        """Return the provider state of a virtual directory.
+
+        Args:
+            mount (VirtualMount): The mount that the directory belongs to
+            provider (ChildrenProvider): The provider of the children of the directory
+        """
+        self.mount = mount
+        self.provider = provider
+        self.materialized = False
+        self.version = None
+        # a directory with changes made by users is never evicted, nor listed again
+        self.modified = False
+        # number of virtual children that are materialized, which have to be evicted first
+        self.materialized_children = 0
+
+    def check_writable(self):
+        if self.provider.read_only and not self.mount.materializing:
+            raise predefined_errors.ReadOnlyFileSystem
+
+    def materialize(self, node: FileNode):
+        if self.mount.materializing:
+            return
+        version = self.provider.version(node)
+        # a directory changed by users keeps its listing: producing it again would drop what
+        # they have made, which the versions still refer to
+        if self.materialized and (version == self.version or self.modified):
+            self.mount.touch(node)
+            return
+        was_materialized = self.materialized
+        if was_materialized:
+            # the listing has changed: produce it again from scratch
+            self.mount.drop_children(node)
+        self.mount.materializing = True
+        try:
+            # producing the children is not a change that undo should take back
+            with versions.suspended():
+                for entry in self.provider.list_children(node):
+                    # whatever users have added before the first listing wins
+                    if entry.name in node._children:
+                        continue
+                    child = FileNode(entry.name, entry.mode, entry.owner, node, link_target=entry.link_target)
+                    if entry.provider is not None:
+                        child._virtual = VirtualDirectory(self.mount, entry.provider)
+        finally:
+            self.mount.materializing = False
+        self.materialized = True
+        self.version = version
+        if not was_materialized and node.parent is not None and node.parent._virtual is not None:
+            node.parent._virtual.materialized_children += 1
+        self.mount.touch(node)
+
+
+class VirtualMount:
+    def __init__(self, system_states: dict, node: FileNode, capacity: int):
+        """Return the LRU cache of the materialized directories under a mount point.
+
+        Args:
+            system_states (dict): The address of the set of system states
+            node (FileNode): The mount point
+            capacity (int): How many directories may stay materialized before the least
+                            recently used ones are evicted
+        """
+        self.system_states = system_states
+        self.node = node
+        self.capacity = capacity
+        self.materializing = False
+        self.lru: OrderedDict = OrderedDict()
+        # every change made by a command under the mount pins the directories holding it
+        self.subscription = watch.subscribe(system_states, node, self._on_change)
+
+    def _on_change(self, event: watch.WatchEvent):
+        # a moved node changes the directory it leaves as well
+        for directory in [event.node.parent, event.old_parent]:
+            while directory is not None and directory._virtual is not None \
+                  and not directory._virtual.modified:
+                directory._virtual.modified = True
+                directory = directory.parent
+
+    def touch(self, node: FileNode):
+        self.lru[node] = None
+        self.lru.move_to_end(node)
+        if len(self.lru) > self.capacity:
+            self.evict()
+
+    def is_evictable(self, node: FileNode) -> bool:
+        state: VirtualDirectory = node._virtual
+        if node is self.node or state.modified or state.materialized_children > 0:
+            return False
+        # the working directory must stay attached to the tree
+        pwd: FileNode = self.system_states["pwd"]
+        return pwd is not node and node not in pwd.ancestors
+
+    def evict(self):
+        # drop the least recently used directories that can be produced again as they are,
+        # never the one that has just been used
+        for node in list(self.lru)[:-1]:
+            if len(self.lru) <= self.capacity:
+                break
+            if self.is_evictable(node):
+                self.drop_children(node)
+                node._virtual.materialized = False
+                if node.parent is not None and node.parent._virtual is not None:
+                    node.parent._virtual.materialized_children -= 1
+                del self.lru[node]
+
+    def drop_children(self, node: FileNode):
+        for child in node._children.values():
+            if child._virtual is not None and child._virtual.materialized:
+                child._virtual.materialized = False
+                node._virtual.materialized_children -= 1
+                self.lru.pop(child, None)
+                self.drop_children(child)
+        node._children = dict()
+        node._sorted_names = None
+        # the children produced again will not have their hashes yet
+        node._digest_sum = None
+        node._stale_children = None
+        node.invalidate_hash()
+
+    def unmount(self):
+        watch.unsubscribe(self.system_states, self.subscription)
+
+
+def mount(system_states: dict, path: str, provider: ChildrenProvider, mode: int = 0b1111101,
+          owner: str = "root", capacity: int = 1024) -> VirtualMount:
+    """Create a virtual directory at a path.
+
+    Args:
+        path (str): An absolute path whose parent directory exists and whose last level does not
+        provider (ChildrenProvider): The provider of the children of the directory
+
+    Returns:
+        VirtualMount: The cache of the materialized directories under the new directory
+    """
+    mount_path = FilePath(system_states, path)
+    parent = mount_path.get_node(system_states, require_parent_node=True)
+    if parent is None or mount_path.get_node(system_states, follow_links=False) is not None:
+        raise ValueError(f"cannot mount at {path}")
+    node = FileNode(mount_path.file_name, mode, owner, parent)
+    accounting.charge(system_states, node)
+    mount_state = VirtualMount(system_states, node, capacity)
+    node._virtual = VirtualDirectory(mount_state, provider)
+    return mount_state
+
+
+class ProcProvider(ChildrenProvider):
+    # /proc: live information about the session, as a read-only tree
+    #   users/NAME                 every user
+    #   session/user/NAME          the effective user
+    #   session/cwd                a symbolic link to the working directory
+    #   usage/NAME/files-N         how many files and directories each user owns
+    #   usage/NAME/directories-N
+    read_only = True
+    DIRECTORY_MODE = 0b1101101
+    FILE_MODE = 0b0100100
+
+    def __init__(self, system_states: dict, section: str = None, user: str = None):
+        self.system_states = system_states
+        self.section = section
+        self.user = user
+
+    def _directory(self, name: str, section: str, user: str = None) -> VirtualEntry:
+        return VirtualEntry(name, self.DIRECTORY_MODE, "root",
+                            ProcProvider(self.system_states, section, user))
+
+    def _file(self, name: str) -> VirtualEntry:
+        return VirtualEntry(name, self.FILE_MODE, "root")
+
+    def list_children(self, node: FileNode) -> list[VirtualEntry]:
+        if self.section is None:
+            return [self._directory("users", "users"), self._directory("session", "session"),
+                    self._directory("usage", "usage")]
+        if self.section == "users":
+            return [self._file(user) for user in self.system_states["users"]]
+        if self.section == "session":
+            pwd = str(FilePath.from_node(self.system_states, self.system_states["pwd"]))
+            return [self._directory("user", "session_user"),
+                    VirtualEntry("cwd", 0b0111111, "root", None, pwd)]
+        if self.section == "session_user":
+            return [self._file(self.system_states["effective_user"])]
+        if self.section == "usage":
+            return [self._directory(user, "user_usage", user) for user in self.system_states["users"]]
+        if self.section == "user_usage":
+            usage = self.system_states.get("usage", {}).get(self.user, {"file": 0, "directory": 0})
+            return [self._file(f"files-{usage['file']}"), self._file(f"directories-{usage['directory']}")]
+        return []
+
+    def version(self, node: FileNode) -> object:
+        # listed again as soon as what they show has changed
+        if self.section == "users" or self.section == "usage":
+            return frozenset(self.system_states["users"])
+        if self.section == "session":
+            return self.system_states["pwd"]
+        if self.section == "session_user":
+            return self.system_states["effective_user"]
+        if self.section == "user_usage":
+            return tuple(self.system_states.get("usage", {}).get(self.user, {}).values())
+        return None
+
+
+def mount_proc(system_states: dict, capacity: int = 1024) -> VirtualMount:
+    return mount(system_states, "/proc", ProcProvider(system_states), ProcProvider.DIRECTORY_MODE,
+                 capacity=capacity)
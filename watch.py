@@ -0,0 +1,141 @@
+from collections import namedtuple
+from file_system import FileNode, FilePath
+from utilities import is_file_doable, is_file_ancestors_doable
+
+# kind is one of "create", "remove", "move", "chmod", "chown" and "restore" (emitted on the root
+# directory when undo, redo or restore may have changed anything);
+# old_path and old_parent tell where a moved node comes from
+WatchEvent = namedtuple("WatchEvent", ["kind", "path", "node", "old_path", "old_parent"],
+                        defaults=[None, None])
+
+
+class Subscription:
+    def __init__(self, node: FileNode, callback, batch_size: int = None, user: str = None):
+        """Return a new subscription to the changes in a subtree.
+
+        Args:
+            node (FileNode): The root of the watched subtree
+            callback: Called with each event, or with a list of events if batched
+            batch_size (int): None to deliver every event at once; otherwise events are held
+                              until the end of the command or until this many are pending.
+            user (str): Only deliver the events about nodes this user could list; None
+                        for every event
+        """
+        self.node = node
+        self.callback = callback
+        self.batch_size = batch_size
+        self.user = user
+        self.pending = []
+
+    def deliver(self, event: WatchEvent):
+        if self.batch_size is None:
+            self.callback(event)
+            return
+        self.pending.append(event)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.pending) > 0:
+            events, self.pending = self.pending, []
+            self.callback(events)
+
+
+def subscribe(system_states: dict, node: FileNode, callback, batch_size: int = None,
+              user: str = None) -> Subscription:
+    """Call back on every change under a node (including the node itself).
+
+    Returns:
+        Subscription: The handle for unsubscribe()
+    """
+    subscription = Subscription(node, callback, batch_size, user)
+    # subscriptions are indexed by the node they watch, so dispatching an event only
+    # looks at the ancestors of the changed node
+    system_states.setdefault("watches", {}).setdefault(node, []).append(subscription)
+    return subscription
+
+
+def unsubscribe(system_states: dict, subscription: Subscription):
+    index: dict = system_states.get("watches", {})
+    subscriptions: list = index.get(subscription.node, [])
+    if subscription in subscriptions:
+        subscription.flush()
+        system_states.get("pending_watches", set()).discard(subscription)
+        subscriptions.remove(subscription)
+        if len(subscriptions) == 0:
+            index.pop(subscription.node)
+
+
+def can_list(user: str, parent: FileNode) -> bool:
+    # whether a user could see the children of a directory: by reading it, after getting to
+    # it through directories they can execute
+    if parent is None:
+        return True
+    as_user = {"effective_user": user}
+    return is_file_doable("r", parent, as_user) and is_file_doable("x", parent, as_user) \
+        and is_file_ancestors_doable("x", parent, as_user)
+
+
+def visible_event(event: WatchEvent, user: str) -> WatchEvent:
+    """Tell what a user may learn from an event.
+
+    Returns:
+        WatchEvent: The event; for a move seen on one side only, a create or a remove on that
+                    side; None if the user could not see the node where it changed
+    """
+    if event.kind != "move":
+        return event if can_list(user, event.node.parent) else None
+    seen_before = can_list(user, event.old_parent)
+    seen_after = can_list(user, event.node.parent)
+    if seen_before and seen_after:
+        return event
+    if seen_after:
+        return WatchEvent("create", event.path, event.node)
+    if seen_before:
+        return WatchEvent("remove", event.old_path, event.node)
+    return None
+
+
+def emit(system_states: dict, kind: str, node: FileNode, old_path: str = None, old_parent: FileNode = None):
+    """Dispatch a change of a node to the subscriptions on the node and its ancestors.
+
+    Removals should be emitted before the node is detached, so the path is still known.
+    Moves are emitted after the node is relinked, with the path and the parent it had before,
+    and reach the subscriptions on both sides once.
+    """
+    index: dict = system_states.get("watches")
+    # nothing to do (not even building the path) when nobody is watching
+    if not index:
+        return
+    subscriptions = []
+    # several ancestors can lead to the same subscription, which gets the event once
+    seen = set()
+    for current_node in [node, old_parent]:
+        while current_node is not None:
+            for subscription in index.get(current_node, ()):
+                if id(subscription) not in seen:
+                    seen.add(id(subscription))
+                    subscriptions.append(subscription)
+            current_node = current_node.parent
+    if len(subscriptions) == 0:
+        return
+    event = WatchEvent(kind, str(FilePath.from_node(system_states, node)), node, old_path, old_parent)
+    pending: set = system_states.setdefault("pending_watches", set())
+    for subscription in subscriptions:
+        delivered = event
+        if subscription.user is not None:
+            # subscribers only hear about what they could have found out by listing
+            delivered = visible_event(event, subscription.user)
+            if delivered is None:
+                continue
+        subscription.deliver(delivered)
+        if len(subscription.pending) > 0:
+            pending.add(subscription)
+
+
+def flush(system_states: dict):
+    # deliver the events held by batched subscriptions; only the ones holding events are
+    # visited, so commands cost nothing more with many idle watchers
+    pending: set = system_states.get("pending_watches")
+    while pending:
+        pending.pop().flush()